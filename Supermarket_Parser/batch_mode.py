@@ -0,0 +1,308 @@
+# batch_mode.py
+
+import os
+import json
+import time
+from functools import partial
+from concurrent.futures import ThreadPoolExecutor
+import pdfplumber
+from openai.types import CompletionUsage
+from log_writer import write_log, log_section
+from parsers.registry import get_parser
+from parsers.openai_client import get_client
+from parsers.llm_cache import get_response as get_cached_response, store_response as store_cached_response
+from db_writer import OfferWriter
+import run_journal
+
+# Offline bulk run: prepare → submit → collect.
+#   prepare  — render the selected pages of every flyer, write them as Batch API request lines
+#   submit   — upload the JSONL and start the batch (or run it through the local stand-in)
+#   collect  — fetch the results and write the offers through the normal normalization + OfferWriter
+# Everything for one week lives in batches/week_<N>/, so the steps can run hours apart.
+BATCH_DIR = "batches"
+ENDPOINT = "/v1/chat/completions"
+COMPLETION_WINDOW = "24h"
+
+# Batch API input limits — bigger runs are split into several batch files
+MAX_REQUESTS_PER_FILE = 50000
+MAX_BYTES_PER_FILE = 190 * 1024 * 1024   # 200 MB limit, with some margin
+
+# The shared client doesn't retry (see parsers/retry_policy.py) — batch calls use the SDK's own retries
+API_RETRIES = 2
+
+
+def week_dir(week_number):
+    return os.path.join(BATCH_DIR, f"week_{week_number}")
+
+
+def _state_path(week_number):
+    return os.path.join(week_dir(week_number), "batch.json")
+
+
+def _load_state(week_number):
+    path = _state_path(week_number)
+    if not os.path.exists(path):
+        raise RuntimeError(f"No prepared batch for week {week_number} — run --batch prepare first")
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _save_state(week_number, state):
+    path = _state_path(week_number)
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(state, f, indent=2)
+    os.replace(path + ".tmp", path)
+
+
+# Helper — custom_id of one page request (unique within the batch, readable in the dashboard)
+def make_custom_id(supermarket, filepath, page_number):
+    return f"{supermarket}|{os.path.basename(filepath)}|p{page_number}"
+
+
+# Render the pages of one flyer → (manifest entries, request lines). Pages that already have a
+# cached GPT response are not sent again; collect takes them from the LLM cache.
+def _prepare_flyer(filepath, supermarket, pages_to_parse):
+    flyer_parser = get_parser(supermarket)
+    entries = []
+    lines = []
+
+    with log_section(chain=supermarket):
+        write_log(f"\n--- Batch prepare: {filepath} ---")
+        with pdfplumber.open(filepath) as pdf:
+            pages = pdf.pages
+            for page_number in pages_to_parse:
+                if not 1 <= page_number <= len(pages):
+                    continue
+                # Always the image — a text-layer answer that fails can't fall back to vision inside a batch
+                rendered = flyer_parser.render_page(filepath, page_number, pages[page_number - 1], text_layer=False)
+                image_url, cache_key = rendered["image_url"], rendered["cache_key"]
+                custom_id = make_custom_id(supermarket, filepath, page_number)
+                cached = get_cached_response(cache_key) is not None
+                entries.append({
+                    "custom_id": custom_id,
+                    "supermarket": supermarket,
+                    "filepath": filepath,
+                    "page": page_number,
+                    "cache_key": cache_key,
+                    "cached": cached
+                })
+                if not cached:
+                    lines.append(json.dumps({
+                        "custom_id": custom_id,
+                        "method": "POST",
+                        "url": ENDPOINT,
+                        "body": flyer_parser.build_request(image_url)
+                    }))
+        write_log(f"[BATCH] {os.path.basename(filepath)}: {len(lines)} requests, {len(entries) - len(lines)} pages from cache")
+
+    return entries, lines
+
+
+# Step 1 — render every selected page of every flyer into batch request files. flyers =
+# [(filepath, supermarket, [page, ...]), ...] — the pages main.py selected (PAGES_TO_PARSE, minus
+# what the week manifest and --resume have as done), same as the interactive run.
+def prepare(flyers, week_number, parallel_flyers=None):
+    folder = week_dir(week_number)
+    os.makedirs(folder, exist_ok=True)
+    write_log(f"\n=== Batch prepare — Week {week_number}: {len(flyers)} flyers ===")
+
+    with ThreadPoolExecutor(max_workers=parallel_flyers or max(1, len(flyers)), thread_name_prefix="flyer") as flyer_pool:
+        results = list(flyer_pool.map(lambda flyer: _prepare_flyer(*flyer), flyers))
+
+    # Split into files within the Batch API limits
+    manifest = []
+    parts = []
+    part_lines, part_bytes = [], 0
+    for entries, lines in results:
+        manifest.extend(entries)
+        for line in lines:
+            line_bytes = len(line.encode("utf-8")) + 1
+            if part_lines and (len(part_lines) >= MAX_REQUESTS_PER_FILE or part_bytes + line_bytes > MAX_BYTES_PER_FILE):
+                parts.append(part_lines)
+                part_lines, part_bytes = [], 0
+            part_lines.append(line)
+            part_bytes += line_bytes
+    if part_lines:
+        parts.append(part_lines)
+
+    state = {"week": week_number, "manifest": manifest, "parts": []}
+    for index, lines in enumerate(parts, start=1):
+        input_path = os.path.join(folder, f"requests_{index:03d}.jsonl")
+        with open(input_path, "w", encoding="utf-8") as f:
+            f.write("\n".join(lines) + "\n")
+        state["parts"].append({"input": input_path, "requests": len(lines), "status": "prepared"})
+        write_log(f"[BATCH] Wrote {input_path}: {len(lines)} requests, {os.path.getsize(input_path) // 1024} KB")
+    _save_state(week_number, state)
+
+    write_log(f"\n✅ Batch prepared: {len(manifest)} pages, {sum(len(lines) for lines in parts)} to submit, {len(parts)} file(s)")
+    return state
+
+
+# Local stand-in for the Batch API: consumes a request JSONL and writes an output JSONL in the
+# Batch API format. Each line goes to the configured client — point OPENAI_BASE_URL at any
+# OpenAI-compatible local server to test the whole prepare → submit → collect flow offline.
+def run_local_batch(input_path, output_path):
+    completed, failed = 0, 0
+    with open(input_path, "r", encoding="utf-8") as src, open(output_path, "w", encoding="utf-8") as out:
+        for number, line in enumerate(src, start=1):
+            if not line.strip():
+                continue
+            request = json.loads(line)
+            result = {"id": f"local_req_{number}", "custom_id": request["custom_id"], "response": None, "error": None}
+            try:
+                body = get_client().with_options(max_retries=API_RETRIES).chat.completions.create(**request["body"]).model_dump()
+                result["response"] = {"status_code": 200, "request_id": f"local_{number}", "body": body}
+                completed += 1
+            except Exception as e:
+                result["error"] = {"code": type(e).__name__, "message": str(e)}
+                failed += 1
+            out.write(json.dumps(result) + "\n")
+    return completed, failed
+
+
+# Step 2 — upload + start the batch (backend "openai"), or run it right away (backend "local")
+def submit(week_number, backend="openai"):
+    state = _load_state(week_number)
+    write_log(f"\n=== Batch submit — Week {week_number} ({backend}) ===")
+
+    for part in state["parts"]:
+        if part["status"] != "prepared":
+            write_log(f"[BATCH] {part['input']}: already {part['status']}, skipped")
+            continue
+
+        if backend == "local":
+            part["output"] = part["input"].replace("requests_", "output_")
+            completed, failed = run_local_batch(part["input"], part["output"])
+            part["status"] = "completed"
+            write_log(f"[BATCH] {part['input']}: local run, {completed} completed, {failed} failed")
+        else:
+            client = get_client().with_options(max_retries=API_RETRIES)
+            with open(part["input"], "rb") as f:
+                input_file = client.files.create(file=f, purpose="batch")
+            batch = client.batches.create(input_file_id=input_file.id, endpoint=ENDPOINT, completion_window=COMPLETION_WINDOW)
+            part["input_file_id"] = input_file.id
+            part["batch_id"] = batch.id
+            part["status"] = "submitted"
+            write_log(f"[BATCH] {part['input']}: submitted as {batch.id}")
+        part["backend"] = backend
+        _save_state(week_number, state)
+
+    write_log("\n✅ Batch submitted.")
+    return state
+
+
+# Helper — fetch a finished OpenAI batch's output (and error) file next to its input file.
+# Returns False while the batch is still running.
+def _download_results(part):
+    client = get_client().with_options(max_retries=API_RETRIES)
+    batch = client.batches.retrieve(part["batch_id"])
+    write_log(f"[BATCH] {part['batch_id']}: {batch.status}")
+    if batch.status in ("validating", "in_progress", "finalizing", "cancelling"):
+        return False
+    if batch.status != "completed":
+        raise RuntimeError(f"Batch {part['batch_id']} ended as {batch.status}")
+
+    part["output"] = part["input"].replace("requests_", "output_")
+    with open(part["output"], "w", encoding="utf-8") as out:
+        for file_id in (batch.output_file_id, batch.error_file_id):
+            if file_id:
+                out.write(client.files.content(file_id).text.rstrip("\n") + "\n")
+    return True
+
+
+# Helper — response body per custom_id from an output JSONL (failed requests are left out)
+def _read_results(output_path):
+    results = {}
+    with open(output_path, "r", encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            result = json.loads(line)
+            response = result.get("response")
+            if result.get("error") or not response or response.get("status_code") != 200:
+                write_log(f"[ERROR] {result['custom_id']}: {result.get('error') or (response or {}).get('body')}")
+                continue
+            results[result["custom_id"]] = response["body"]
+    return results
+
+
+# Offers of one page from its response text — None if the response can't be parsed
+def _page_offers(flyer_parser, entry, response_text):
+    try:
+        offers_json = flyer_parser.parse_response(response_text)
+    except Exception as e:
+        write_log(f"[ERROR] Page {entry['page']}: {e}")
+        return None
+    if offers_json is None:
+        return None
+    write_log(f"[INFO] Parsed {len(offers_json)} items from page {entry['page']}.")
+    return [flyer_parser.normalize_offer(item, entry["filepath"], entry["page"]) for item in offers_json]
+
+
+# Step 3 — ingest finished results into dbo.Supermarket_Offers. Pages that failed are logged as
+# [SKIP_PAGE], so retry_failed_pages.py picks them up like after an interactive run.
+def collect(week_number, wait=False, poll_seconds=60):
+    state = _load_state(week_number)
+    write_log(f"\n=== Batch collect — Week {week_number} ===")
+
+    # All parts must be finished first — the offers of one flyer can span parts
+    for part in state["parts"]:
+        if part["status"] == "prepared":
+            raise RuntimeError(f"{part['input']} was never submitted — run --batch submit first")
+        while part["status"] == "submitted":
+            if _download_results(part):
+                part["status"] = "completed"
+                _save_state(week_number, state)
+            elif wait:
+                time.sleep(poll_seconds)
+            else:
+                write_log("\n⏳ Batch still running — collect again later (or use --batch_wait).")
+                return False
+
+    responses = {}
+    local_ids = set()   # answered by the local stand-in — billed at the normal price, not the batch price
+    for part in state["parts"]:
+        part_responses = _read_results(part["output"])
+        responses.update(part_responses)
+        if part.get("backend") == "local":
+            local_ids.update(part_responses)
+
+    # Group the pages per flyer, in page order — one OfferWriter per flyer, as in the interactive run
+    flyers = {}
+    for entry in state["manifest"]:
+        flyers.setdefault((entry["filepath"], entry["supermarket"]), []).append(entry)
+
+    for (filepath, supermarket), entries in flyers.items():
+        flyer_parser = get_parser(supermarket)
+        with log_section(chain=supermarket):
+            write_log(f"\n--- Batch collect: {filepath} ---")
+            writer = OfferWriter(supermarket, week_number)
+            run_journal.add_pages(week_number, filepath, supermarket, [entry["page"] for entry in entries])
+            try:
+                for entry in sorted(entries, key=lambda e: e["page"]):
+                    from_cache = entry["custom_id"] not in responses
+                    if from_cache:
+                        response_text = get_cached_response(entry["cache_key"])
+                    else:
+                        body = responses[entry["custom_id"]]
+                        response_text = body["choices"][0]["message"]["content"]
+                        if body.get("usage"):
+                            flyer_parser.record_usage(flyer_parser.model, CompletionUsage.model_validate(body["usage"]),
+                                                      batch=entry["custom_id"] not in local_ids)
+                    page_offers = _page_offers(flyer_parser, entry, response_text) if response_text is not None else None
+                    if page_offers is None:
+                        write_log(f"[SKIP_PAGE] {entry['page']} {os.path.basename(filepath)}")
+                        run_journal.page_finished(week_number, filepath, entry["page"], False)
+                        continue
+                    if not from_cache:
+                        store_cached_response(entry["cache_key"], flyer_parser.model, response_text)
+                    writer.put_page(entry["page"], page_offers)
+                    writer.finish_page(entry["page"], partial(run_journal.page_finished, week_number, filepath, entry["page"], offers=len(page_offers)))
+            finally:
+                writer.close()
+                write_log(f"[RESULT] Inserted {writer.total_inserted} offers, Skipped {writer.total_skipped} duplicates for: {supermarket}")
+
+    state["collected"] = True
+    _save_state(week_number, state)
+    write_log("\n✅ Batch collected.")
+    return True
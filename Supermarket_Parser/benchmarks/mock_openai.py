@@ -0,0 +1,151 @@
+# benchmarks/mock_openai.py
+
+import json
+import time
+import hashlib
+import argparse
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+# Local stand-in for the OpenAI chat completions endpoint — answers every page with canned offer
+# JSON after a configurable latency, streamed (with a usage chunk) or as one response. Offer
+# names are derived from the image, so every page gets its own rows and a re-sent page the same.
+#   python -m benchmarks.mock_openai --port 8765 --latency 1.5
+#   OPENAI_BASE_URL=http://127.0.0.1:8765/v1 python main.py ...
+DEFAULT_LATENCY = 1.0        # seconds from request to the closing "]"
+FIRST_TOKEN_SHARE = 0.3      # share of the latency before the first token
+DEFAULT_OFFERS = 12          # offers per answer
+PROMPT_TOKENS = 1100         # reported in usage — the mock doesn't look at the image size
+CACHED_TOKENS = 1024         # reported as cached once a system prompt was seen before (like the API's prompt cache)
+
+
+# Helper — canned offers for one page image. Prices are consistent with the OfferType (25% off the
+# original, "1+1 gratis" at the original price), so answers pass parsers/cascade.py's validation
+# and the benchmark measures the cascade without escalations.
+def _page_offers(content, offers_per_page):
+    digest = hashlib.sha256(json.dumps(content, sort_keys=True).encode("utf-8")).hexdigest()[:8]
+    offers = []
+    for index in range(1, offers_per_page + 1):
+        original_cents = (1 + index % 7) * 100 + (index % 10) * 10 + 9
+        multibuy = index % 3 == 0
+        offer_cents = original_cents if multibuy else original_cents * 3 // 4
+        offers.append({
+            "ProductName": f"Product {digest}-{index}",
+            "OfferType": "1+1 gratis" if multibuy else "25% korting",
+            "OriginalPrice": f"{original_cents // 100}.{original_cents % 100:02d}",
+            "OfferPrice": f"{offer_cents // 100}.{offer_cents % 100:02d}",
+            "OfferStartDate": "2025-06-23",
+            "OfferEndDate": "2025-06-29",
+        })
+    return offers
+
+
+# Helper — canned answer for one request. A packed request ("Page N:" before each image, see
+# parsers/packing.py) gets offers for every page, tagged with "Page".
+def make_offers(request, offers_per_page):
+    content = request["messages"][1]["content"]
+    labels = [part["text"] for part in content if part["type"] == "text" and part["text"].startswith("Page ")] if isinstance(content, list) else []
+    if not labels:
+        return _page_offers(content, offers_per_page)
+    images = [part for part in content if part["type"] == "image_url"]
+    offers = []
+    for label, image in zip(labels, images):
+        page_number = int(label[len("Page "):].rstrip(":"))
+        offers.extend(dict(offer, Page=page_number) for offer in _page_offers(image, offers_per_page))
+    return offers
+
+
+class MockHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"    # keep-alive, like the real API
+    latency = DEFAULT_LATENCY
+    offers_per_page = DEFAULT_OFFERS
+    seen_prompts = set()
+    seen_lock = threading.Lock()
+
+    # Helper — prompt tokens served from the "prompt cache": the system prompt was sent before
+    def _cached_tokens(self, request):
+        prompt = request["messages"][0]["content"]
+        with self.seen_lock:
+            seen = prompt in self.seen_prompts
+            self.seen_prompts.add(prompt)
+        return CACHED_TOKENS if seen else 0
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status, body):
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_POST(self):
+        request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+        if not self.path.endswith("/chat/completions"):
+            self._send_json(404, {"error": {"message": f"unknown path {self.path}"}})
+            return
+
+        offers = make_offers(request, self.offers_per_page)
+        items = [json.dumps(offer, ensure_ascii=False) for offer in offers]
+        text = "```json\n[\n" + ",\n".join(items) + "\n]\n```"
+        usage = {"prompt_tokens": PROMPT_TOKENS, "completion_tokens": len(text) // 4, "total_tokens": PROMPT_TOKENS + len(text) // 4,
+                 "prompt_tokens_details": {"cached_tokens": self._cached_tokens(request)}}
+        base = {"id": "chatcmpl-mock", "created": int(time.time()), "model": request["model"]}
+
+        if not request.get("stream"):
+            time.sleep(self.latency)
+            self._send_json(200, dict(base, object="chat.completion", usage=usage, choices=[
+                {"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}
+            ]))
+            return
+
+        # Streamed: first token after a share of the latency, the offers spread over the rest
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        time.sleep(self.latency * FIRST_TOKEN_SHARE)
+        pieces = ["```json\n[\n"] + [item + (",\n" if index < len(items) - 1 else "\n") for index, item in enumerate(items)] + ["]\n```"]
+        delay = self.latency * (1 - FIRST_TOKEN_SHARE) / len(pieces)
+        for piece in pieces:
+            self._send_event(dict(base, object="chat.completion.chunk", choices=[{"index": 0, "delta": {"content": piece}, "finish_reason": None}]))
+            time.sleep(delay)
+        self._send_event(dict(base, object="chat.completion.chunk", choices=[{"index": 0, "delta": {}, "finish_reason": "stop"}]))
+        if (request.get("stream_options") or {}).get("include_usage"):
+            self._send_event(dict(base, object="chat.completion.chunk", choices=[], usage=usage))
+        self._send_chunk(b"data: [DONE]\n\n")
+        self._send_chunk(b"")
+
+    def _send_event(self, body):
+        self._send_chunk(f"data: {json.dumps(body)}\n\n".encode("utf-8"))
+
+    # Helper — one HTTP/1.1 chunk (an empty one ends the response)
+    def _send_chunk(self, data):
+        self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+        self.wfile.flush()
+
+
+# Start the mock in a background thread → (server, base_url); server.shutdown() stops it
+def start_server(latency=DEFAULT_LATENCY, offers_per_page=DEFAULT_OFFERS, port=0):
+    handler = type("ConfiguredMockHandler", (MockHandler,), {"latency": latency, "offers_per_page": offers_per_page, "seen_prompts": set()})
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="mock-openai", daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/v1"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local mock of the OpenAI chat completions endpoint")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=DEFAULT_LATENCY, help="Seconds per answer")
+    parser.add_argument("--offers", type=int, default=DEFAULT_OFFERS, help="Offers per answer")
+    args = parser.parse_args()
+
+    server, base_url = start_server(args.latency, args.offers, args.port)
+    print(f"Mock OpenAI endpoint on {base_url} — Ctrl+C to stop")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
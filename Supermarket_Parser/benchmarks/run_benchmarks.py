@@ -0,0 +1,206 @@
+# benchmarks/run_benchmarks.py
+
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import tempfile
+import subprocess
+from datetime import datetime
+
+try:
+    import resource   # Unix only
+except ImportError:
+    resource = None
+
+# Throughput benchmark without API costs: synthetic flyers, the local mock endpoint and the SQLite
+# stand-in for the offers table. Every scenario runs in its own process (clean peak RSS) from a
+# scratch folder, with the LLM and render caches off so each run does the full work.
+#   parse_pdf — one flyer, every page, through BaseFlyerParser.parse_pdf (render inline, no DB)
+#   main      — main.py on a week folder: render pool, flyer pool, API pool, OfferWriter
+# Results (pages/sec, rows/sec, peak RSS, time per stage from metrics.py) go to one JSON file
+# per run in benchmarks/results/, named after the commit, so runs can be compared across commits.
+#   python -m benchmarks.run_benchmarks --latency 0.5 --pages 6
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(PROJECT_DIR, "benchmarks", "results")
+
+SCENARIOS = ("parse_pdf", "main")
+CHAINS = ("AH", "ALDI", "JUMBO", "LIDL", "PLUS")
+BENCHMARK_WEEK = 1
+
+
+# Helper — peak resident memory in MB of this process and of its finished child processes (render pool).
+# Windows has no resource module: the process's peak working set via psutil if it's installed, no
+# value for the render workers; None when neither is available.
+def peak_rss_mb():
+    if resource is None:
+        try:
+            import psutil
+        except ImportError:
+            return None, None
+        info = psutil.Process().memory_info()
+        return round(getattr(info, "peak_wset", info.rss) / 1024 / 1024, 1), None
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    scale = 1024 * 1024 if sys.platform == "darwin" else 1024   # bytes on macOS, KB on Linux
+    return round(own / scale, 1), round(children / scale, 1)
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=PROJECT_DIR, capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+# Runs in the scenario process: point the client at the mock, switch the caches off
+def _setup(base_url, caches):
+    os.environ["OPENAI_BASE_URL"] = base_url
+    from parsers import openai_client, llm_cache, render_cache
+    openai_client.OPENAI_API_KEY = "benchmark"
+    llm_cache.ENABLED = caches
+    render_cache.ENABLED = caches
+
+
+def run_parse_pdf(flyer_folder, db_path, pages):
+    from log_writer import init_log, close_log
+    from parsers.registry import get_parse_func
+    import metrics
+
+    init_log("benchmark")
+    metrics.reset()
+    filepath = os.path.join(flyer_folder, f"{CHAINS[0]}_W{BENCHMARK_WEEK}.pdf")
+    started = time.perf_counter()
+    offers = get_parse_func(CHAINS[0])(filepath, BENCHMARK_WEEK, pages_to_parse=list(range(1, pages + 1)))
+    seconds = time.perf_counter() - started
+    close_log()
+    return {"pages": pages, "rows": len(offers), "seconds": seconds}
+
+
+def run_main(flyer_folder, db_path, pages):
+    from benchmarks import sqlite_offers
+    from log_writer import close_log
+    import main as main_script
+    import metrics
+
+    sqlite_offers.install(db_path)
+    flyers = len([name for name in os.listdir(flyer_folder) if name.lower().endswith(".pdf")])
+    sys.argv = ["main.py", "--input_folder", flyer_folder, "--week", str(BENCHMARK_WEEK)]
+    started = time.perf_counter()
+    main_script.main()
+    seconds = time.perf_counter() - started
+    close_log()
+    pages_parsed = metrics.get_summary()["run"]["counters"].get("pages", flyers * len(main_script.PAGES_TO_PARSE))
+    return {"pages": pages_parsed, "rows": sqlite_offers.count_rows(db_path), "seconds": seconds}
+
+
+SCENARIO_FUNCS = {"parse_pdf": run_parse_pdf, "main": run_main}
+
+
+# Scenario process — runs one scenario in the scratch folder and writes its result JSON
+def run_scenario(args):
+    _setup(args.base_url, args.caches)
+    import metrics
+
+    os.chdir(args.work_dir)
+    result = SCENARIO_FUNCS[args.scenario](args.flyer_folder, os.path.join(args.work_dir, "offers.sqlite"), args.pages)
+    summary = metrics.get_summary()
+    own_rss, children_rss = peak_rss_mb()
+    result.update({
+        "seconds": round(result["seconds"], 3),
+        "pages_per_sec": round(result["pages"] / result["seconds"], 3),
+        "rows_per_sec": round(result["rows"] / result["seconds"], 3),
+        "peak_rss_mb": own_rss,
+        "peak_rss_children_mb": children_rss,
+        "stages": summary["run"]["stages"],
+        "counters": summary["run"]["counters"],
+    })
+    with open(args.result_file, "w", encoding="utf-8") as f:
+        json.dump(result, f)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark parse_pdf and main.py against a local mock endpoint")
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument("--flyers", type=int, default=len(CHAINS), help=f"Flyers in the week folder (1-{len(CHAINS)}, one per chain)")
+    parser.add_argument("--pages", type=int, default=6, help="Pages per synthetic flyer (main.py parses its PAGES_TO_PARSE of them)")
+    parser.add_argument("--offers", type=int, default=12, help="Offers per mock answer")
+    parser.add_argument("--latency", type=float, default=1.0, help="Seconds per mock answer")
+    parser.add_argument("--caches", action="store_true", help="Keep the LLM / render caches on (default: off, every page does the full work)")
+    parser.add_argument("--output", default=None, help="Result JSON file (default: benchmarks/results/<timestamp>_<commit>.json)")
+    parser.add_argument("--verbose", action="store_true", help="Show the pipeline's own log output")
+    # Internal — set when the runner starts a scenario process
+    parser.add_argument("--scenario", choices=SCENARIOS, help=argparse.SUPPRESS)
+    parser.add_argument("--base_url", help=argparse.SUPPRESS)
+    parser.add_argument("--work_dir", help=argparse.SUPPRESS)
+    parser.add_argument("--flyer_folder", help=argparse.SUPPRESS)
+    parser.add_argument("--result_file", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if not 1 <= args.flyers <= len(CHAINS):
+        parser.error(f"--flyers must be between 1 and {len(CHAINS)}")
+
+    if args.scenario:
+        run_scenario(args)
+        return
+
+    from benchmarks.synthetic_flyers import make_flyer_folder
+    from benchmarks.mock_openai import start_server
+
+    server, base_url = start_server(latency=args.latency, offers_per_page=args.offers)
+    results = {}
+    with tempfile.TemporaryDirectory(prefix="supermarket_bench_") as scratch:
+        flyer_folder = os.path.join(scratch, "flyers")
+        started = time.perf_counter()
+        make_flyer_folder(flyer_folder, CHAINS[:args.flyers], args.pages, week_number=BENCHMARK_WEEK)
+        print(f"Generated {args.flyers} flyers x {args.pages} pages in {time.perf_counter() - started:.1f}s")
+
+        for scenario in args.scenarios:
+            work_dir = os.path.join(scratch, scenario)
+            os.makedirs(work_dir)
+            result_file = os.path.join(work_dir, "result.json")
+            print(f"Running {scenario}...")
+            completed = subprocess.run(
+                [sys.executable, "-m", "benchmarks.run_benchmarks", "--scenario", scenario, "--base_url", base_url,
+                 "--work_dir", work_dir, "--flyer_folder", flyer_folder, "--result_file", result_file,
+                 "--pages", str(args.pages)] + (["--caches"] if args.caches else []),
+                cwd=PROJECT_DIR, stdout=None if args.verbose else subprocess.DEVNULL,
+            )
+            if completed.returncode != 0 or not os.path.exists(result_file):
+                print(f"❌ {scenario} failed (exit code {completed.returncode}) — rerun with --verbose")
+                results[scenario] = {"error": f"exit code {completed.returncode}"}
+                continue
+            with open(result_file, "r", encoding="utf-8") as f:
+                results[scenario] = json.load(f)
+            result = results[scenario]
+            own_rss, children_rss = result["peak_rss_mb"], result["peak_rss_children_mb"]
+            memory = "peak RSS n/a" if own_rss is None else f"peak RSS {own_rss:.0f} MB"
+            if children_rss is not None:
+                memory += f" (+{children_rss:.0f} MB render workers)"
+            print(f"✅ {scenario}: {result['pages']} pages in {result['seconds']:.1f}s — {result['pages_per_sec']:.2f} pages/s, "
+                  f"{result['rows_per_sec']:.1f} rows/s, {memory}")
+    server.shutdown()
+
+    commit = git_commit()
+    report = {
+        "commit": commit,
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "settings": {"flyers": args.flyers, "pages": args.pages, "offers": args.offers, "latency": args.latency, "caches": args.caches},
+        "results": results,
+    }
+    output = args.output
+    if output is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        output = os.path.join(RESULTS_DIR, f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{commit or 'nocommit'}.json")
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+        f.write("\n")
+    print(f"Results written to {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+# benchmarks/sqlite_offers.py
+
+import hashlib
+import sqlite3
+import db_writer
+
+# SQLite stand-in for dbo.Supermarket_Offers, so the write stage can be benchmarked without a SQL
+# Server. install() swaps db_writer's connection and insert helpers; OfferWriter, its queue and its
+# commit-per-batch stay the real code. Dedup works like the real table: a unique hash over the
+# same seven columns (upper-cased), duplicates are skipped by the insert. Typed prices are REAL
+# here (decimal(10,2) in SQL Server).
+SCHEMA = """
+    CREATE TABLE IF NOT EXISTS Supermarket_Offers (
+        SupermarketName TEXT, WeekNumber INTEGER, ProductName TEXT, OfferType TEXT,
+        OriginalPrice TEXT, OfferPrice TEXT, SourcePDF TEXT, InsertedAt TEXT, PageNumber INTEGER,
+        OfferPriceMin REAL, OfferPriceMax REAL, OriginalPriceMin REAL, OriginalPriceMax REAL,
+        OfferKind TEXT, Quantity INTEGER,
+        DedupHash BLOB NOT NULL UNIQUE
+    )
+"""
+
+
+def _dedup_hash(week_number, offer, source_pdf):
+    text = "|".join(str(value) for value in (
+        week_number, offer["ProductName"], offer["OfferType"], offer["OriginalPrice"], offer["OfferPrice"],
+        source_pdf, offer["PageNumber"]
+    ))
+    return hashlib.sha256(text.upper().encode("utf-16-le")).digest()
+
+
+def _ensure_schema(conn):
+    conn.execute(SCHEMA)
+    conn.commit()
+
+
+# Same contract as db_writer.write_offers → (inserted, duplicates), the caller commits
+def _write_offers(cursor, supermarket_name, week_number, offers):
+    if not offers:
+        return 0, 0
+    rows = []
+    for offer in offers:
+        source_pdf = offer["SourcePDF"].replace("\\", "/").split("/")[-1]
+        rows.append((
+            supermarket_name, week_number, offer["ProductName"], offer["OfferType"], offer["OriginalPrice"],
+            offer["OfferPrice"], source_pdf, offer["InsertedAt"], offer["PageNumber"],
+            *(float(offer[field]) if offer.get(field) is not None else None
+              for field in ("OfferPriceMin", "OfferPriceMax", "OriginalPriceMin", "OriginalPriceMax")),
+            offer.get("OfferKind"), offer.get("Quantity"),
+            _dedup_hash(week_number, offer, source_pdf)
+        ))
+    changes_before = cursor.connection.total_changes
+    cursor.executemany("INSERT OR IGNORE INTO Supermarket_Offers VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+    inserted = cursor.connection.total_changes - changes_before
+    return inserted, len(rows) - inserted
+
+
+# Point db_writer at a SQLite file for the rest of the process
+def install(path):
+    db_writer.connect = lambda: sqlite3.connect(path, timeout=30, check_same_thread=False)
+    db_writer.database_error = lambda: sqlite3.Error
+    db_writer.ensure_schema = _ensure_schema
+    db_writer.create_staging_table = lambda cursor: None
+    db_writer.write_offers = _write_offers
+
+
+def count_rows(path):
+    conn = sqlite3.connect(path)
+    try:
+        return conn.execute("SELECT COUNT(*) FROM Supermarket_Offers").fetchone()[0]
+    finally:
+        conn.close()
@@ -0,0 +1,77 @@
+# benchmarks/startup_check.py
+
+import os
+import sys
+import time
+import argparse
+import subprocess
+
+# Startup regression check: `python main.py --help` must stay fast and must not load the heavy
+# modules — main.py only imports them after the arguments are parsed (parsers/registry.py loads
+# a chain's parser on first use). Exits with 1 when either check fails.
+#   python -m benchmarks.startup_check
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+MAX_HELP_SECONDS = 1.5   # Adjust as needed — wall time of `python main.py --help`, best of RUNS
+RUNS = 3
+HEAVY_MODULES = ("openai", "pdfplumber", "pyodbc", "PIL", "fitz", "numpy")
+
+# Runs in a fresh interpreter: main.py's --help path, then the heavy modules that got imported
+_PROBE = """
+import sys
+sys.argv = ["main.py", "--help"]
+import main
+try:
+    main.main()
+except SystemExit:
+    pass
+print("LOADED=" + ",".join(name for name in {modules!r} if name in sys.modules))
+"""
+
+
+# Helper — best wall time of `python main.py --help` over RUNS runs
+def time_help():
+    best = None
+    for _ in range(RUNS):
+        started = time.perf_counter()
+        subprocess.run([sys.executable, "main.py", "--help"], cwd=PROJECT_DIR, stdout=subprocess.DEVNULL, check=True)
+        seconds = time.perf_counter() - started
+        best = seconds if best is None else min(best, seconds)
+    return best
+
+
+# Helper — heavy modules imported by the --help path
+def loaded_heavy_modules():
+    completed = subprocess.run(
+        [sys.executable, "-c", _PROBE.format(modules=HEAVY_MODULES)],
+        cwd=PROJECT_DIR, capture_output=True, text=True, check=True
+    )
+    line = [line for line in completed.stdout.splitlines() if line.startswith("LOADED=")][-1]
+    return [name for name in line[len("LOADED="):].split(",") if name]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check that main.py --help stays fast and skips the heavy imports")
+    parser.add_argument("--max_seconds", type=float, default=MAX_HELP_SECONDS, help="Allowed wall time of main.py --help")
+    args = parser.parse_args()
+
+    failed = False
+    seconds = time_help()
+    if seconds > args.max_seconds:
+        print(f"❌ main.py --help took {seconds:.2f}s (limit {args.max_seconds:.2f}s)")
+        failed = True
+    else:
+        print(f"✅ main.py --help took {seconds:.2f}s (limit {args.max_seconds:.2f}s)")
+
+    loaded = loaded_heavy_modules()
+    if loaded:
+        print(f"❌ main.py --help imports {', '.join(loaded)} — move the import after argument parsing")
+        failed = True
+    else:
+        print(f"✅ main.py --help imports none of {', '.join(HEAVY_MODULES)}")
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+# benchmarks/synthetic_flyers.py
+
+import os
+import random
+from PIL import Image, ImageDraw
+
+# Synthetic flyers for the benchmarks: multi-page image PDFs with a grid of product boxes
+# (name, old price, offer price), about the size and pixel count of a real scanned flyer page.
+PAGE_SIZE = (1240, 1754)     # A4 at 150 DPI
+PAGE_DPI = 150
+GRID = (4, 3)                # rows, columns of product boxes per page
+
+PRODUCTS = ["Halfvolle melk", "Bananen", "Kipfilet", "Jonge kaas", "Pindakaas", "Appelsap", "Volkoren brood",
+            "Koffiebonen", "Tomaten", "Spaghetti", "Yoghurt", "Chips", "Frisdrank", "Roomboter", "Eieren"]
+
+
+# One flyer page as an image
+def make_page(page_number, seed=0):
+    rng = random.Random(seed * 1000 + page_number)
+    image = Image.new("RGB", PAGE_SIZE, (255, 255, 255))
+    draw = ImageDraw.Draw(image)
+    rows, cols = GRID
+    box_w, box_h = PAGE_SIZE[0] // cols, PAGE_SIZE[1] // rows
+
+    for row in range(rows):
+        for col in range(cols):
+            left, top = col * box_w, row * box_h
+            colour = tuple(rng.randint(120, 255) for _ in range(3))
+            draw.rectangle((left + 10, top + 10, left + box_w - 10, top + box_h - 10), fill=colour, outline=(0, 0, 0), width=3)
+            draw.ellipse((left + 40, top + 40, left + box_w - 40, top + box_h // 2), fill=tuple(c // 2 for c in colour))
+
+            original = rng.randint(100, 999) / 100
+            offer = round(original * rng.choice((0.5, 0.65, 0.75)), 2)
+            draw.text((left + 30, top + box_h // 2 + 20), rng.choice(PRODUCTS), fill=(0, 0, 0))
+            draw.text((left + 30, top + box_h // 2 + 50), f"{original:.2f}", fill=(90, 90, 90))
+            draw.text((left + 30, top + box_h // 2 + 80), f"{offer:.2f}", fill=(200, 0, 0))
+    return image
+
+
+# One flyer PDF with this many pages
+def make_flyer(path, pages, seed=0):
+    images = [make_page(page_number, seed) for page_number in range(1, pages + 1)]
+    images[0].save(path, "PDF", resolution=PAGE_DPI, save_all=True, append_images=images[1:])
+    return path
+
+
+# A week folder with one flyer per chain, named so the registry detects them (e.g. "AH_W1.pdf")
+def make_flyer_folder(folder, chains, pages, week_number=1):
+    os.makedirs(folder, exist_ok=True)
+    paths = []
+    for seed, chain in enumerate(chains):
+        paths.append(make_flyer(os.path.join(folder, f"{chain}_W{week_number}.pdf"), pages, seed=seed))
+    return paths
@@ -0,0 +1,100 @@
+# compare_profiles.py
+
+import os
+import argparse
+from parsers.registry import detect_chain, get_parse_func
+from log_writer import write_log, init_log, close_log
+
+
+# Helper — offers keyed by page + product so two runs can be lined up
+def index_offers(offers):
+    indexed = {}
+    for offer in offers:
+        key = (offer["PageNumber"], offer["ProductName"].strip().lower())
+        indexed.setdefault(key, offer)
+    return indexed
+
+
+# Differences of one profile's offers against the baseline profile's offers
+def diff_offers(baseline_offers, offers):
+    baseline = index_offers(baseline_offers)
+    candidate = index_offers(offers)
+
+    missing = [baseline[key] for key in baseline if key not in candidate]
+    extra = [candidate[key] for key in candidate if key not in baseline]
+    changed = []
+    for key in baseline:
+        if key in candidate:
+            fields = [
+                field for field in ("OfferType", "OriginalPrice", "OfferPrice")
+                if baseline[key][field] != candidate[key][field]
+            ]
+            if fields:
+                changed.append((baseline[key], candidate[key], fields))
+    return missing, extra, changed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare image profiles on one flyer")
+    parser.add_argument("--pdf", required=True, help="Path to the flyer PDF")
+    parser.add_argument("--week", required=True, type=int, help="Week number")
+    parser.add_argument("--pages", type=int, nargs="+", default=[1, 2], help="Pages to compare")
+    parser.add_argument("--profiles", nargs="+", default=["png300", "jpeg200", "webp200"],
+                        help="Profiles to compare, see parsers/image_profiles.py — the first one is the baseline")
+    args = parser.parse_args()
+
+    from parsers import image_profiles
+    unknown = [name for name in args.profiles if name not in image_profiles.PROFILES]
+    if unknown:
+        parser.error(f"Unknown image profile(s): {', '.join(unknown)} (choose from {', '.join(sorted(image_profiles.PROFILES))})")
+
+    pdf_name = os.path.basename(args.pdf)
+    supermarket = detect_chain(pdf_name)
+    if supermarket is None:
+        parser.error(f"No parser for: {pdf_name}")
+    parse_func = get_parse_func(supermarket)
+
+    init_log("compare_profiles")
+    write_log(f"\n=== Image profile comparison — {pdf_name} — pages {args.pages} ===")
+
+    # Parse the same pages once per profile (nothing is written to the DB)
+    results = {}
+    for profile_name in args.profiles:
+        write_log(f"\n--- Profile: {profile_name} ---")
+        image_profiles.set_profile_override(profile_name)
+        image_profiles.reset_payload_stats()
+        offers = parse_func(args.pdf, args.week, pages_to_parse=args.pages)
+        payload = image_profiles.get_payload_stats().get(profile_name, {"pages": 0, "bytes": 0})
+        results[profile_name] = (offers, payload)
+    image_profiles.set_profile_override(None)
+
+    # Report every profile against the baseline
+    baseline_name = args.profiles[0]
+    baseline_offers, baseline_payload = results[baseline_name]
+    write_log(f"\n=== Results (baseline: {baseline_name}) ===")
+    for profile_name in args.profiles:
+        offers, payload = results[profile_name]
+        average_kb = payload["bytes"] / max(1, payload["pages"]) / 1024
+        size_change = ""
+        if profile_name != baseline_name and baseline_payload["bytes"]:
+            size_change = f" ({(payload['bytes'] / baseline_payload['bytes'] - 1) * 100:+.0f}% vs {baseline_name})"
+
+        missing, extra, changed = diff_offers(baseline_offers, offers)
+        write_log(
+            f"[COMPARE] {profile_name}: avg {average_kb:.0f} KB/page{size_change}, {len(offers)} offers, "
+            f"{len(missing)} missing, {len(extra)} extra, {len(changed)} changed"
+        )
+        for offer in missing:
+            write_log(f"    - missing p{offer['PageNumber']}: {offer['ProductName']} {offer['OfferPrice']}")
+        for offer in extra:
+            write_log(f"    + extra   p{offer['PageNumber']}: {offer['ProductName']} {offer['OfferPrice']}")
+        for base_offer, offer, fields in changed:
+            details = ", ".join(f"{field} {base_offer[field]!r} → {offer[field]!r}" for field in fields)
+            write_log(f"    ~ changed p{offer['PageNumber']}: {offer['ProductName']} — {details}")
+
+    write_log("\n✅ Comparison done.")
+    close_log()
+
+
+if __name__ == "__main__":
+    main()
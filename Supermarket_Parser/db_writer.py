@@ -0,0 +1,282 @@
+# db_writer.py
+
+import os
+import time
+import queue
+import threading
+import contextvars
+from log_writer import write_log, log_event
+import metrics
+
+DB_CONNECTION_STRING = "DRIVER={ODBC Driver 17 for SQL Server};SERVER=localhost;DATABASE=AI_Supermarket;Trusted_Connection=yes;" # Adjust as needed
+
+# Pages (or streamed pieces of a page) waiting for the writer before the model stage has to wait — caps memory per flyer
+MAX_QUEUED_PAGES = 8
+
+# Streamed offers are collected into one bulk write — written once this many are waiting, once the
+# oldest has waited WRITE_MAX_DELAY seconds, or when a page is finished (its journal entry waits
+# for the commit)
+WRITE_BATCH_OFFERS = 200     # Adjust as needed
+WRITE_MAX_DELAY = 2.0        # Adjust as needed
+
+
+# pyodbc is imported on first connect — the benchmarks' SQLite stand-in (and --help) work without an
+# ODBC driver manager
+def connect():
+    import pyodbc
+    return pyodbc.connect(DB_CONNECTION_STRING)
+
+
+# Exception type of a failed DB write (swapped together with connect by the SQLite stand-in)
+def database_error():
+    import pyodbc
+    return pyodbc.Error
+
+
+# Dedup key: the seven columns the old WHERE NOT EXISTS compared, hashed into one binary(32).
+# UPPER keeps the old case-insensitive comparison; N'|' makes both tables hash the same nvarchar text.
+DEDUP_HASH_SQL = (
+    "CAST(HASHBYTES('SHA2_256', UPPER(CONCAT_WS(N'|', WeekNumber, ProductName, OfferType, "
+    "OriginalPrice, OfferPrice, SourcePDF, PageNumber))) AS binary(32))"
+)
+
+
+# Typed columns filled from normalize_offer (parsers/offer_values.py) — prices as decimals, so price
+# queries don't parse the varchar prices. NULL price = the text wasn't a price ("Not Clear").
+TYPED_COLUMNS = (
+    ("OfferPriceMin", "decimal(10,2) NULL"),
+    ("OfferPriceMax", "decimal(10,2) NULL"),
+    ("OriginalPriceMin", "decimal(10,2) NULL"),
+    ("OriginalPriceMax", "decimal(10,2) NULL"),
+    ("OfferKind", "varchar(20) NULL"),
+    ("Quantity", "int NULL"),
+)
+TYPED_FIELDS = [name for name, _ in TYPED_COLUMNS]
+
+# Rows per UPDATE batch when existing offers get their typed columns
+BACKFILL_BATCH_SIZE = 5000  # Adjust as needed
+
+
+# One-time migration: persisted hash column + unique index, so a duplicate check is one index seek,
+# and the typed price columns (existing rows are filled in once, see backfill_typed_columns)
+def ensure_schema(conn):
+    cursor = conn.cursor()
+    cursor.execute(f"""
+        IF COL_LENGTH('dbo.Supermarket_Offers', 'DedupHash') IS NULL
+            ALTER TABLE dbo.Supermarket_Offers ADD DedupHash AS {DEDUP_HASH_SQL} PERSISTED
+    """)
+    cursor.execute("""
+        IF NOT EXISTS (
+            SELECT 1 FROM sys.indexes
+            WHERE name = 'UX_Supermarket_Offers_DedupHash' AND object_id = OBJECT_ID('dbo.Supermarket_Offers')
+        )
+            CREATE UNIQUE INDEX UX_Supermarket_Offers_DedupHash ON dbo.Supermarket_Offers (DedupHash)
+    """)
+    for name, column_type in TYPED_COLUMNS:
+        cursor.execute(f"""
+            IF COL_LENGTH('dbo.Supermarket_Offers', '{name}') IS NULL
+                ALTER TABLE dbo.Supermarket_Offers ADD {name} {column_type}
+        """)
+    conn.commit()
+    backfill_typed_columns(conn)
+
+
+# Rows from before the typed columns (OfferKind IS NULL) get them from the same parser as new
+# offers, and so do "van X voor Y" rows stored as multibuy before offer_values read them as a
+# discount. Only does work on the first run after the migration / the parser fix.
+def backfill_typed_columns(conn):
+    from parsers.offer_values import typed_values, offer_kind
+
+    cursor = conn.cursor()
+    cursor.execute("""
+        SELECT ID, OfferType, OriginalPrice, OfferPrice, OfferKind FROM dbo.Supermarket_Offers
+        WHERE OfferKind IS NULL OR (OfferKind = 'multibuy' AND OfferType LIKE '%van%voor%')
+    """)
+    # "vanaf 2 voor 5,-" matches the LIKE and stays multibuy — only rows whose kind changes are updated
+    rows = [row[:4] for row in cursor.fetchall() if row[4] is None or offer_kind(row[1]) != row[4]]
+    if not rows:
+        return
+    write_log(f"[INFO] Filling the typed price columns of {len(rows)} existing offers")
+    cursor.fast_executemany = True
+    for start in range(0, len(rows), BACKFILL_BATCH_SIZE):
+        updates = []
+        for row_id, offer_type, original_price, offer_price in rows[start:start + BACKFILL_BATCH_SIZE]:
+            values = typed_values(offer_type, original_price, offer_price)
+            updates.append([values[field] for field in TYPED_FIELDS] + [row_id])
+        cursor.executemany(
+            f"UPDATE dbo.Supermarket_Offers SET {', '.join(f'{field} = ?' for field in TYPED_FIELDS)} WHERE ID = ?",
+            updates
+        )
+        conn.commit()
+
+
+# Session staging table with the offers table's own column types (InsertedAt stays text until the insert)
+def create_staging_table(cursor):
+    cursor.execute("""
+        SELECT TOP 0 SupermarketName, WeekNumber, ProductName, OfferType, OriginalPrice, OfferPrice,
+               SourcePDF, CAST(NULL AS nvarchar(20)) AS InsertedAt, PageNumber,
+               OfferPriceMin, OfferPriceMax, OriginalPriceMin, OriginalPriceMax, OfferKind, Quantity
+        INTO #OfferStaging
+        FROM dbo.Supermarket_Offers
+    """)
+    cursor.execute(f"ALTER TABLE #OfferStaging ADD DedupHash AS {DEDUP_HASH_SQL}")
+
+
+# Bulk insert offers that aren't in the table yet: one fast_executemany into #OfferStaging, then
+# one set-based anti-join on DedupHash (also drops duplicates inside the batch).
+# Needs create_staging_table() on the same connection. Returns (inserted, duplicates); the caller commits.
+def write_offers(cursor, supermarket_name, week_number, offers):
+    if not offers:
+        return 0, 0
+
+    rows = [
+        (
+            supermarket_name,
+            week_number,
+            offer["ProductName"],
+            offer["OfferType"],
+            offer["OriginalPrice"],
+            offer["OfferPrice"],
+            os.path.basename(offer["SourcePDF"]),  # keep only the filename (without full path)
+            offer["InsertedAt"],
+            offer["PageNumber"],
+            *(offer.get(field) for field in TYPED_FIELDS)
+        )
+        for offer in offers
+    ]
+
+    cursor.execute("TRUNCATE TABLE #OfferStaging")
+    cursor.fast_executemany = True
+    cursor.executemany("""
+        INSERT INTO #OfferStaging
+        (SupermarketName, WeekNumber, ProductName, OfferType, OriginalPrice, OfferPrice, SourcePDF, InsertedAt, PageNumber,
+         OfferPriceMin, OfferPriceMax, OriginalPriceMin, OriginalPriceMax, OfferKind, Quantity)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    """, rows)
+
+    cursor.execute("""
+        INSERT INTO dbo.Supermarket_Offers
+        (SupermarketName, WeekNumber, ProductName, OfferType, OriginalPrice, OfferPrice, SourcePDF, InsertedAt, PageNumber,
+         OfferPriceMin, OfferPriceMax, OriginalPriceMin, OriginalPriceMax, OfferKind, Quantity)
+        SELECT s.SupermarketName, s.WeekNumber, s.ProductName, s.OfferType, s.OriginalPrice, s.OfferPrice,
+               s.SourcePDF, CONVERT(date, s.InsertedAt, 105), s.PageNumber,   -- 105 = dd-mm-yyyy
+               s.OfferPriceMin, s.OfferPriceMax, s.OriginalPriceMin, s.OriginalPriceMax, s.OfferKind, s.Quantity
+        FROM (
+            SELECT *, ROW_NUMBER() OVER (PARTITION BY DedupHash ORDER BY (SELECT NULL)) AS rn
+            FROM #OfferStaging
+        ) s
+        WHERE s.rn = 1
+        AND NOT EXISTS (
+            SELECT 1 FROM dbo.Supermarket_Offers o WHERE o.DedupHash = s.DedupHash
+        )
+    """)
+    total_inserted = max(cursor.rowcount, 0)
+    return total_inserted, len(rows) - total_inserted
+
+
+# Write stage of the flyer pipeline: offers are queued as soon as GPT streams them in and a
+# background thread collects them into bulk writes + commits (WRITE_BATCH_OFFERS / WRITE_MAX_DELAY,
+# and at every finished page), so rows land while later pages are still being parsed and a crash
+# keeps every page that was already written.
+class OfferWriter:
+    def __init__(self, supermarket_name, week_number, max_queued_pages=MAX_QUEUED_PAGES):
+        self.supermarket_name = supermarket_name
+        self.week_number = week_number
+        self.total_inserted = 0
+        self.total_skipped = 0
+        self.pages_written = 0
+        self._pages = set()   # a page arrives in several pieces while its answer streams in
+        self._failed_pages = set()
+        self._queue = queue.Queue(maxsize=max_queued_pages)
+        self._error = None
+        # Same context as the caller so the writer's log lines stay in the flyer's log section
+        self._thread = threading.Thread(
+            target=contextvars.copy_context().run, args=(self._run,), name=f"writer-{supermarket_name}", daemon=True
+        )
+        self._thread.start()
+
+    # Called from the page threads with each page's offers as they stream in — blocks while the
+    # queue is full (backpressure on the model stage)
+    def put_page(self, page_number, offers):
+        if self._error is not None:
+            raise self._error
+        self._queue.put((page_number, offers, None))
+
+    # A page's last offers are queued — on_committed(ok) runs once they are committed (ok=True) or
+    # their write failed (ok=False). Used to mark the page done in the run journal.
+    def finish_page(self, page_number, on_committed):
+        if self._error is not None:
+            raise self._error
+        self._queue.put((page_number, [], on_committed))
+
+    def _run(self):
+        conn = None
+        done = False
+        batch = []           # (page_number, offers, on_committed) waiting for the next bulk write
+        batch_offers = 0
+        batch_started = None
+        try:
+            conn = connect()
+            db_error = database_error()
+            cursor = conn.cursor()
+            create_staging_table(cursor)
+            while not done:
+                # Wait for more until the batch is big enough, old enough, or has a finished page
+                timeout = None if not batch else max(0.0, batch_started + WRITE_MAX_DELAY - time.monotonic())
+                try:
+                    item = self._queue.get(timeout=timeout)
+                except queue.Empty:
+                    item = False
+                if item is None:
+                    done = True
+                elif item:
+                    if not batch:
+                        batch_started = time.monotonic()
+                    batch.append(item)
+                    batch_offers += len(item[1])
+                    if item[2] is None and batch_offers < WRITE_BATCH_OFFERS:
+                        continue
+                if not batch:
+                    continue
+
+                offers = [offer for _, page_offers, _ in batch for offer in page_offers]
+                started = time.monotonic()
+                try:
+                    inserted, skipped = write_offers(cursor, self.supermarket_name, self.week_number, offers)
+                    conn.commit()
+                except db_error as e:
+                    conn.rollback()
+                    pages = sorted({page_number for page_number, page_offers, _ in batch if page_offers})
+                    self._failed_pages.update(pages)
+                    write_log(f"[ERROR] Failed to insert {len(offers)} offers from pages {pages}: {e}", stage="write")
+                else:
+                    self.total_inserted += inserted
+                    self.total_skipped += skipped
+                    self._pages.update(page_number for page_number, _, _ in batch)
+                    self.pages_written = len(self._pages)
+                    if offers:
+                        duration = time.monotonic() - started
+                        log_event("write", offers=len(offers), inserted=inserted, duration=round(duration, 3))
+                        metrics.observe(self.supermarket_name, "write", duration)
+                        metrics.count(self.supermarket_name, "offers_inserted", inserted)
+                        metrics.count(self.supermarket_name, "offers_skipped", skipped)
+
+                for page_number, _, on_committed in batch:
+                    if on_committed is not None:
+                        on_committed(page_number not in self._failed_pages)
+                batch, batch_offers = [], 0
+        except Exception as e:
+            self._error = e
+            # Keep draining so page threads blocked on put_page don't hang
+            while not done and self._queue.get() is not None:
+                pass
+        finally:
+            if conn is not None:
+                conn.close()
+
+    # Flush the remaining pages and stop the writer — raises if the writer failed
+    def close(self):
+        self._queue.put(None)
+        self._thread.join()
+        if self._error is not None:
+            raise self._error
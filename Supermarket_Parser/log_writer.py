@@ -1,13 +1,51 @@
 # log_writer.py
 
 import os
+import sys
+import json
+import queue
+import atexit
+import threading
+import contextvars
+from contextlib import contextmanager
 from datetime import datetime
 
 # Set once per run — filled by main.py or retry_failed_pages.py
 LOG_FILE_PATH = None
 
-def init_log(log_prefix):
-    global LOG_FILE_PATH
+# Optional JSON-lines sink next to the text log (init_log(..., json_lines=True)): one object per
+# line with the message plus chain / page / stage / duration where the caller knows them
+JSON_LOG_PATH = None
+
+# Worker processes find the run's log files through the environment (spawned processes re-import
+# this module and never see init_log)
+LOG_FILE_ENV = "SUPERMARKET_LOG_FILE"
+JSON_LOG_FILE_ENV = "SUPERMARKET_JSON_LOG_FILE"
+
+# Lines are queued and written by one background thread — callers never wait on the console or the
+# disk. The writer takes everything that is waiting and writes it in one go (batched flushes).
+MAX_BATCH = 2000
+
+# flush_log() / close_log() wait at most this long for the writer (seconds) — a stuck console or
+# disk must not hang the end of a run
+FLUSH_TIMEOUT = 10
+
+_queue = queue.Queue()
+_writer = None
+_writer_pid = None
+_writer_lock = threading.Lock()
+
+# Lines written inside log_section() are held back and written to the file as one block,
+# so flyers parsed in parallel still show up as one readable chunk per chain
+_section_lines = contextvars.ContextVar("log_section_lines", default=None)
+
+# Structured fields (e.g. chain) that apply to everything logged in the current context
+_context_fields = contextvars.ContextVar("log_context_fields", default={})
+
+
+def init_log(log_prefix, json_lines=False):
+    global LOG_FILE_PATH, JSON_LOG_PATH
+    flush_log()
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
 
     if log_prefix.startswith("retry_"):
@@ -15,6 +53,11 @@ def init_log(log_prefix):
         log_dir = "retry_logs"
         os.makedirs(log_dir, exist_ok=True)
         LOG_FILE_PATH = os.path.join(log_dir, f"{log_prefix}_{timestamp}.txt")
+    elif log_prefix.startswith("compare_"):
+        # Tool runs (e.g. compare_profiles) go to logs folder under their own name
+        log_dir = "logs"
+        os.makedirs(log_dir, exist_ok=True)
+        LOG_FILE_PATH = os.path.join(log_dir, f"{log_prefix}_{timestamp}.txt")
     else:
         # Normal run logs go to logs folder
         log_dir = "logs"
@@ -23,12 +66,207 @@ def init_log(log_prefix):
 
     with open(LOG_FILE_PATH, "w", encoding="utf-8") as f:
         f.write(f"=== Supermarket Parser Log — {log_prefix} — {timestamp} ===\n")
+    os.environ[LOG_FILE_ENV] = LOG_FILE_PATH
+
+    JSON_LOG_PATH = None
+    os.environ.pop(JSON_LOG_FILE_ENV, None)
+    if json_lines:
+        JSON_LOG_PATH = os.path.splitext(LOG_FILE_PATH)[0] + ".jsonl"
+        open(JSON_LOG_PATH, "w", encoding="utf-8").close()
+        os.environ[JSON_LOG_FILE_ENV] = JSON_LOG_PATH
+
+    _start_writer()
+
+
+# Helper — the run's log files, also inside worker processes
+def _log_paths():
+    return LOG_FILE_PATH or os.environ.get(LOG_FILE_ENV), JSON_LOG_PATH or os.environ.get(JSON_LOG_FILE_ENV)
+
+
+def _start_writer():
+    global _writer, _writer_pid
+    with _writer_lock:
+        if _writer is None or not _writer.is_alive() or _writer_pid != os.getpid():
+            _writer = threading.Thread(target=_run_writer, name="log-writer", daemon=True)
+            _writer_pid = os.getpid()
+            _writer.start()
+
+
+# Background writer — one queue item is (records, to_console, to_file), an Event (flush marker)
+# or None (stop)
+def _run_writer():
+    files = {}
+    try:
+        stop = False
+        while not stop:
+            batch = [_queue.get()]
+            while len(batch) < MAX_BATCH:
+                try:
+                    batch.append(_queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            flushed = [item for item in batch if isinstance(item, threading.Event)]
+            stop = any(item is None for item in batch)
+            # File first — a console that can't print a line must not cost the log file its lines.
+            # Every failure is reported and the writer goes on with the next batch.
+            try:
+                console_text, file_text, json_text = [], [], []
+                for item in batch:
+                    if item is None or isinstance(item, threading.Event):
+                        continue
+                    records, to_console, to_file = item
+                    if to_console:
+                        console_text.extend(f"{record['message']}\n" for record in records)
+                    if to_file:
+                        file_text.extend(f"{record['message']}\n" for record in records if record["message"] is not None)
+                        json_text.extend(json.dumps(record, ensure_ascii=False, default=str) + "\n" for record in records)
+
+                log_path, json_path = _log_paths()
+                for path, text in ((log_path, file_text), (json_path, json_text)):
+                    if path and text:
+                        try:
+                            if path not in files:
+                                files[path] = open(path, "a", encoding="utf-8")
+                            files[path].write("".join(text))
+                            files[path].flush()
+                        except (OSError, ValueError) as e:
+                            _report_error(f"log file {path}", e, len(text))
+                            f = files.pop(path, None)
+                            if f is not None:
+                                _close_quietly(f)
+                if console_text:
+                    try:
+                        _write_console("".join(console_text))
+                    except (OSError, ValueError) as e:
+                        _report_error("console", e, len(console_text))
+            except Exception as e:
+                _report_error("log", e, len(batch))   # e.g. a record that can't be formatted — the writer keeps running
+            finally:
+                for event in flushed:
+                    event.set()
+    finally:
+        for f in files.values():
+            _close_quietly(f)
+
+
+# Helper — console write; characters the console encoding can't show (e.g. emoji on a cp1252
+# Windows console) are replaced instead of failing the whole batch
+def _write_console(text):
+    try:
+        sys.stdout.write(text)
+    except UnicodeEncodeError:
+        encoding = getattr(sys.stdout, "encoding", None) or "utf-8"
+        sys.stdout.write(text.encode(encoding, errors="replace").decode(encoding))
+    sys.stdout.flush()
+
 
-def write_log(message):
-    global LOG_FILE_PATH
-    if LOG_FILE_PATH is None:
+# Helper — a failed write is reported on stderr (the log itself may be what's failing)
+def _report_error(target, error, lines):
+    try:
+        sys.stderr.write(f"[LOG_ERROR] {lines} lines not written to the {target}: {error}\n")
+    except (OSError, ValueError):
+        pass
+
+
+def _close_quietly(f):
+    try:
+        f.close()
+    except (OSError, ValueError):
+        pass
+
+
+# Helper — write records straight to the files (worker processes, or after close_log). One append
+# per file, so lines from different processes don't interleave.
+def _write_direct(records, to_console=True, to_file=True):
+    if to_console:
+        print("".join(record["message"] + "\n" for record in records), end="", flush=True)
+    if not to_file:
+        return
+    log_path, json_path = _log_paths()
+    with open(log_path, "a", encoding="utf-8") as f:
+        f.write("".join(record["message"] + "\n" for record in records if record["message"] is not None))
+    if json_path:
+        with open(json_path, "a", encoding="utf-8") as f:
+            f.write("".join(json.dumps(record, ensure_ascii=False) + "\n" for record in records))
+
+
+def _emit(records, to_console, to_file):
+    if os.getpid() != _writer_pid or _writer is None or not _writer.is_alive():
+        _write_direct(records, to_console, to_file)
+    else:
+        _queue.put((records, to_console, to_file))
+
+
+def _make_record(message, fields):
+    log_path, _ = _log_paths()
+    if log_path is None:
         raise Exception("LOG_FILE_PATH is not initialized — please call init_log() first")
 
-    print(message)
-    with open(LOG_FILE_PATH, "a", encoding="utf-8") as f:
-        f.write(message + "\n")
+    record = {"ts": datetime.now().isoformat(timespec="milliseconds"), "pid": os.getpid(), "thread": threading.current_thread().name}
+    record.update(_context_fields.get())
+    record.update((key, value) for key, value in fields.items() if value is not None)
+    record["message"] = message
+    return record
+
+
+# fields (optional) go to the JSON-lines sink only, e.g. write_log(msg, page=3, stage="render", duration=1.2)
+def write_log(message, **fields):
+    record = _make_record(message, fields)
+
+    section = _section_lines.get()
+    if section is not None:
+        section.append(record)
+        _emit([record], to_console=True, to_file=False)
+    else:
+        _emit([record], to_console=True, to_file=True)
+
+
+# Structured event for the JSON-lines sink only (timings etc. that would clutter the text log) —
+# dropped when the run has no JSON sink
+def log_event(stage, **fields):
+    _, json_path = _log_paths()
+    if json_path is None:
+        return
+    record = _make_record(None, dict(fields, stage=stage))   # message None = not in the text log
+    _emit([record], to_console=False, to_file=True)
+
+
+# Group everything logged inside the block (from any page thread) into one chunk of the log file.
+# fields (e.g. chain="AH") are added to every JSON record logged inside the block.
+@contextmanager
+def log_section(**fields):
+    lines = []
+    token = _section_lines.set(lines)
+    fields_token = _context_fields.set({**_context_fields.get(), **fields})
+    try:
+        yield
+    finally:
+        _context_fields.reset(fields_token)
+        _section_lines.reset(token)
+        if lines:
+            _emit(lines, to_console=False, to_file=True)
+
+
+# Block until everything logged so far is on disk
+def flush_log():
+    if _writer is None or not _writer.is_alive() or _writer_pid != os.getpid():
+        return
+    done = threading.Event()
+    _queue.put(done)
+    if not done.wait(FLUSH_TIMEOUT):
+        _report_error("log", f"writer didn't flush within {FLUSH_TIMEOUT}s", _queue.qsize())
+
+
+# Flush and stop the writer — called at the end of a run (and at exit, in case a script doesn't)
+def close_log():
+    global _writer
+    flush_log()
+    with _writer_lock:
+        if _writer is not None and _writer.is_alive() and _writer_pid == os.getpid():
+            _queue.put(None)
+            _writer.join(FLUSH_TIMEOUT)
+        _writer = None
+
+
+atexit.register(close_log)
@@ -2,96 +2,316 @@
 
 import os
 import argparse
-import pyodbc
-from parsers.ah_parser import parse_pdf as ah_parse
-from parsers.aldi_parser import parse_pdf as aldi_parse
-from parsers.jumbo_parser import parse_pdf as jumbo_parse
-from parsers.lidl_parser import parse_pdf as lidl_parse
-from parsers.plus_parser import parse_pdf as plus_parse
-from log_writer import write_log, init_log  
-
-# Parse arguments
-parser = argparse.ArgumentParser(description="Supermarket Parser — Main Run")
-parser.add_argument("--input_folder", required=True, help="Input folder with flyers")
-parser.add_argument("--week", required=True, type=int, help="Week number")
-args = parser.parse_args()
-
-input_folder = args.input_folder
-week_number = args.week
-
-# INIT LOG — first!
-init_log(week_number)
-
-# DB connection
-conn = pyodbc.connect("DRIVER={ODBC Driver 17 for SQL Server};SERVER=localhost;DATABASE=AI_Supermarket;Trusted_Connection=yes;") # Adjust as needed
-cursor = conn.cursor()
-
-write_log(f"\n=== Supermarket Parser Run — Week {week_number} ===")
-write_log(f"Processing folder: {input_folder}\n")
-
-# Map PDF file → parser function → supermarket name
-parser_map = {
-    "AH": (ah_parse, "AH"),
-    "ALDI": (aldi_parse, "ALDI"),
-    "JUMBO": (jumbo_parse, "JUMBO"),
-    "LIDL": (lidl_parse, "LIDL"),
-    "PLUS": (plus_parse, "PLUS")
-}
-
-# Process PDFs
-for filename in os.listdir(input_folder):
-    if filename.lower().endswith(".pdf"):
-        filepath = os.path.join(input_folder, filename)
-        supermarket = next((key for key in parser_map if key in filename.upper()), None)
-
-        if supermarket:
-            parse_func, supermarket_name = parser_map[supermarket]
-            write_log(f"\n--- Processing: {filepath} ---")
-            offers = parse_func(filepath, week_number, pages_to_parse=list(range(1, 3)))   # Pages 1 and 2
-
-            total_inserted = 0
-            for offer in offers:
-                try:
-                    cursor.execute("""
-                        INSERT INTO dbo.Supermarket_Offers
-                        (SupermarketName, WeekNumber, ProductName, OfferType, OriginalPrice, OfferPrice, SourcePDF, InsertedAt, PageNumber)
-                        SELECT ?, ?, ?, ?, ?, ?, ?, ?, ?
-                        WHERE NOT EXISTS (
-                            SELECT 1 FROM dbo.Supermarket_Offers
-                            WHERE WeekNumber = ?
-                            AND ProductName = ?
-                            AND OfferType = ?
-                            AND OriginalPrice = ?
-                            AND OfferPrice = ?
-                            AND SourcePDF = ?
-                            AND PageNumber = ?
-                        )
-                    """, (
-                        supermarket_name,
-                        week_number,
-                        offer["ProductName"],
-                        offer["OfferType"],
-                        offer["OriginalPrice"],
-                        offer["OfferPrice"],
-                        offer["SourcePDF"],
-                        offer["InsertedAt"],
-                        offer["PageNumber"],
-                        # params for WHERE NOT EXISTS
-                        week_number,
-                        offer["ProductName"],
-                        offer["OfferType"],
-                        offer["OriginalPrice"],
-                        offer["OfferPrice"],
-                        offer["SourcePDF"],
-                        offer["PageNumber"]
-                    ))
-                    if cursor.rowcount > 0:
-                        total_inserted += 1
-                except Exception as e:
-                    write_log(f"[ERROR] Failed to insert offer: {offer} — {e}")
-
-            conn.commit()
-            write_log(f"[RESULT] Inserted {total_inserted} offers into DB for: {supermarket_name}")
-
-write_log("\n✅ All done.")
-conn.close()
+from log_writer import write_log, init_log, log_section, close_log
+
+# Only stdlib + log_writer at import time — parsers, pdfplumber, openai and pyodbc are loaded
+# after the arguments are parsed, so --help and argument errors return immediately.
+
+PAGES_TO_PARSE = list(range(1, 3))   # Pages 1 and 2
+
+
+# Parse one flyer and stream its offers into the DB — runs on the flyer pool. Three stages
+# overlap: pages are rendered in this thread, parsed on the shared API pool, and written page
+# by page by the flyer's OfferWriter thread (its own DB connection, commit per page).
+def process_flyer(filepath, supermarket, week_number, pages_to_parse=None, label="Processing"):
+    from parsers.registry import get_parse_func
+    from db_writer import OfferWriter
+
+    parse_func, supermarket_name = get_parse_func(supermarket), supermarket
+
+    with log_section(chain=supermarket_name):
+        write_log(f"\n--- {label}: {filepath} ---")
+        writer = OfferWriter(supermarket_name, week_number)
+        try:
+            # Pages are marked done in the run journal once the writer committed their offers
+            parse_func(filepath, week_number, pages_to_parse=pages_to_parse or PAGES_TO_PARSE,
+                       on_page=writer.put_page, on_page_done=writer.finish_page)
+        finally:
+            writer.close()
+            write_log(f"[RESULT] Inserted {writer.total_inserted} offers, Skipped {writer.total_skipped} duplicates for: {supermarket_name}",
+                      stage="result", inserted=writer.total_inserted, skipped=writer.total_skipped)
+
+
+# Work-queue worker loop — runs on the flyer pool: lease a few pages of one PDF, parse them like
+# any flyer, then settle the lease from the run journal (pages committed = done, the rest back to
+# the queue). Ends when the week has nothing queued or leased any more.
+def work_leases(week_number, worker_id, input_folder=None):
+    import time
+    import run_journal
+    import work_queue
+
+    while True:
+        task = work_queue.lease(week_number, worker_id)
+        if task is None:
+            if work_queue.pending(week_number) == 0:
+                return
+            time.sleep(work_queue.POLL_SECONDS)   # other workers hold the rest — a lease may still run out
+            continue
+        pdf_name, filepath, supermarket, pages = task
+        if input_folder and not os.path.exists(filepath):
+            filepath = os.path.join(input_folder, pdf_name)   # shared folder mounted elsewhere on this machine
+        # The journal may still have these pages as done from an earlier run — they start as pending,
+        # so only what this lease commits counts as done
+        run_journal.add_pages(week_number, os.path.join(os.path.dirname(filepath), pdf_name), supermarket, pages)
+        try:
+            process_flyer(filepath, supermarket, week_number, pages, label=f"Worker {worker_id} (pages {pages})")
+        except Exception as e:
+            write_log(f"[ERROR] Failed to process flyer: {filepath} — {e}")
+        done, not_done = work_queue.finish(week_number, worker_id, pdf_name, pages,
+                                           run_journal.done_pages(week_number).get(pdf_name, ()))
+        write_log(f"[QUEUE] {pdf_name} pages {pages}: {done} done, {not_done} back to the queue / failed")
+
+
+# Coordinator with --queue_wait: log the queue's progress until every page is done or failed
+def wait_for_queue(week_number):
+    import time
+    import work_queue
+
+    last_stats = None
+    while work_queue.pending(week_number):
+        stats = work_queue.get_stats(week_number)
+        if stats != last_stats:
+            write_log(f"[QUEUE] Week {week_number} pages: {stats}")
+            last_stats = stats
+        time.sleep(work_queue.POLL_SECONDS)
+
+
+# Hash-keyed dedup column + unique index (no-op once the table has them)
+def ensure_schema():
+    import db_writer
+    conn = db_writer.connect()
+    db_writer.ensure_schema(conn)
+    conn.close()
+
+
+# Stage timings / tokens / bytes of the run → log summary (p50 / p95 page latency) + Prometheus textfile + JSON
+def export_metrics(week_number, metrics_dir=None):
+    import metrics
+    metrics.log_summary()
+    prom_path, json_path = metrics.export(week_number, metrics_dir)
+    write_log(f"[METRICS] Written to {prom_path} and {json_path}")
+
+
+def build_arg_parser():
+    parser = argparse.ArgumentParser(description="Supermarket Parser — Main Run")
+    parser.add_argument("--input_folder", help="Input folder with flyers (not needed for --batch submit/collect)")
+    parser.add_argument("--week", required=True, type=int, help="Week number")
+    parser.add_argument("--max_in_flight", type=int, default=None, help="Page requests in flight at once, shared by all flyers (1 = serial)")
+    parser.add_argument("--rpm", type=int, default=None, help="OpenAI requests-per-minute limit")
+    parser.add_argument("--tpm", type=int, default=None, help="OpenAI tokens-per-minute limit")
+    parser.add_argument("--parallel_flyers", type=int, default=None, help="Flyers parsed at the same time (default: all in the folder)")
+    parser.add_argument("--render_workers", type=int, default=None, help="Processes for page rendering (default: CPU count)")
+    parser.add_argument("--image_profile", default=None, help="Image profile for all chains, see parsers/image_profiles.py (default: each parser's IMAGE_PROFILE)")
+    parser.add_argument("--resume", action="store_true", help="Only parse the pages the run journal doesn't have as done for this week")
+    parser.add_argument("--full", action="store_true", help="Parse every flyer again, ignoring the folder's manifest (see week_manifest.py)")
+    parser.add_argument("--journal", default=None, help="Run journal file (default: run_journal.sqlite)")
+    parser.add_argument("--page_index", default=None, help="Perceptual page index file (default: page_index.sqlite)")
+    parser.add_argument("--no_reuse", action="store_true", help="Don't reuse offers of pages seen in earlier flyers — every page goes to GPT")
+    parser.add_argument("--log_json", action="store_true", help="Also write a JSON-lines log (chain / page / stage / duration per line) next to the text log")
+    parser.add_argument("--metrics_dir", default=None, help="Folder for the run's Prometheus textfile + JSON metrics summary (default: metrics)")
+    parser.add_argument("--batch", choices=["prepare", "submit", "collect"], default=None, help="Offline Batch API run, one step at a time (see batch_mode.py)")
+    parser.add_argument("--batch_backend", choices=["openai", "local"], default="openai", help="submit: OpenAI Batch API, or the local stand-in")
+    parser.add_argument("--batch_wait", action="store_true", help="collect: wait for the batch to finish instead of returning")
+    parser.add_argument("--queue", default=None, help="Shared work-queue file for --enqueue / --worker (default: work_queue.sqlite, see work_queue.py)")
+    parser.add_argument("--enqueue", action="store_true", help="Coordinator: queue the folder's pages for workers instead of parsing them")
+    parser.add_argument("--queue_wait", action="store_true", help="--enqueue: wait until the workers are finished, then update the folder's manifest")
+    parser.add_argument("--worker", action="store_true", help="Worker: parse pages leased from the queue until it is empty (--input_folder optional, for a differently mounted share)")
+    parser.add_argument("--worker_id", default=None, help="Worker name in the queue (default: host-pid)")
+    return parser
+
+
+def main():
+    # Parse arguments
+    parser = build_arg_parser()
+    args = parser.parse_args()
+    if args.input_folder is None and args.batch not in ("submit", "collect") and not args.worker:
+        parser.error("--input_folder is required")
+    if args.worker and (args.enqueue or args.batch):
+        parser.error("--worker can't be combined with --enqueue or --batch")
+
+    from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+    from parsers.dispatch import configure as configure_dispatch
+    from parsers.registry import detect_chain
+    from parsers.rendering import set_render_pool
+    from parsers.llm_cache import log_stats as log_cache_stats
+    from parsers import render_cache
+    from parsers import image_profiles
+    from parsers import page_index
+    import run_journal
+    import metrics
+    import work_queue
+    from week_manifest import WeekManifest
+
+    input_folder = args.input_folder
+    week_number = args.week
+
+    # Concurrent page dispatch limits (defaults live in parsers/dispatch.py)
+    configure_dispatch(max_in_flight=args.max_in_flight, requests_per_minute=args.rpm, tokens_per_minute=args.tpm)
+    try:
+        image_profiles.set_profile_override(args.image_profile)
+    except ValueError as e:
+        parser.error(str(e))
+
+    # INIT LOG — first!
+    init_log(str(week_number), json_lines=args.log_json)
+    metrics.reset()   # run duration counts from here
+
+    write_log(f"\n=== Supermarket Parser Run — Week {week_number} ===")
+    if input_folder:
+        write_log(f"Processing folder: {input_folder}\n")
+
+    # Per-page run journal — what --resume and retry_failed_pages.py work from
+    run_journal.open_journal(args.journal)
+
+    # Batch submit / collect — no flyers to scan
+    if args.batch in ("submit", "collect"):
+        import batch_mode
+        if args.batch == "submit":
+            batch_mode.submit(week_number, backend=args.batch_backend)
+        else:
+            ensure_schema()
+            batch_mode.collect(week_number, wait=args.batch_wait)
+            export_metrics(week_number, args.metrics_dir)
+        log_cache_stats()
+        write_log("\n✅ All done.")
+        close_log()
+        return
+
+    # Work-queue worker — pages come from the shared queue, not from the folder. Each worker has
+    # its own API pool and rate limits (--rpm / --tpm per worker), render pool and DB writers.
+    if args.worker:
+        ensure_schema()
+        if not args.no_reuse:
+            page_index.open_index(args.page_index)
+        work_queue.open_queue(args.queue)
+        worker_id = args.worker_id or work_queue.default_worker_id()
+        parallel_leases = args.parallel_flyers or work_queue.WORKER_LEASES
+        write_log(f"[QUEUE] Worker {worker_id}, {parallel_leases} leases at a time — week {week_number} pages: {work_queue.get_stats(week_number)}")
+        heartbeat = work_queue.LeaseHeartbeat(week_number, worker_id)
+        try:
+            with ProcessPoolExecutor(max_workers=args.render_workers) as render_pool:
+                set_render_pool(render_pool)
+                with ThreadPoolExecutor(max_workers=parallel_leases, thread_name_prefix="flyer") as flyer_pool:
+                    futures = [flyer_pool.submit(work_leases, week_number, worker_id, input_folder) for _ in range(parallel_leases)]
+                    for future in futures:
+                        future.result()
+                set_render_pool(None)
+        finally:
+            heartbeat.stop()
+            work_queue.release(week_number, worker_id)   # pages still leased (crash / Ctrl+C) go back now
+        write_log(f"[QUEUE] Week {week_number} pages: {work_queue.get_stats(week_number)}")
+        work_queue.close_queue()
+        image_profiles.log_stats()
+        log_cache_stats()
+        render_cache.log_stats()
+        render_cache.evict()
+        page_index.log_stats()
+        page_index.close_index()
+        export_metrics(week_number, args.metrics_dir)
+        run_journal.close_journal()
+        write_log("\n✅ All done.")
+        close_log()
+        return
+
+    # Collect flyers — the folder's manifest skips unchanged flyers whose pages are all done (--full
+    # parses everything again); with --resume, only the pages the run journal doesn't have as done
+    manifest = WeekManifest(input_folder, week_number)
+    done_pages = run_journal.done_pages(week_number) if args.resume else {}
+    flyers = []
+    for filename in os.listdir(input_folder):
+        if filename.lower().endswith(".pdf"):
+            filepath = os.path.join(input_folder, filename)
+            supermarket = detect_chain(filename)
+            if supermarket:
+                status, pages = ("new", list(PAGES_TO_PARSE)) if args.full else manifest.pages_left(filepath, PAGES_TO_PARSE)
+                if status == "unchanged" and not pages:
+                    write_log(f"[MANIFEST] {filename}: unchanged, all pages done — skipped")
+                    continue
+                if status == "unchanged":
+                    write_log(f"[MANIFEST] {filename}: unchanged, pages {pages} left")
+                elif status == "replaced":
+                    write_log(f"[MANIFEST] {filename}: replaced by a new version — parsing all pages")
+                if status != "replaced":   # the journal's pages belong to the old file
+                    pages = [page for page in pages if page not in done_pages.get(filename, set())]
+                if not pages:
+                    write_log(f"[RESUME] {filename}: all pages done, skipped")
+                    continue
+                if args.resume and len(pages) < len(PAGES_TO_PARSE):
+                    write_log(f"[RESUME] {filename}: pages {pages} left")
+                flyers.append((filepath, supermarket, pages))
+
+    # Work-queue coordinator — the selected pages go to the shared queue for the workers. With
+    # --queue_wait it stays until they are finished and records the outcome in the manifest.
+    if args.enqueue:
+        work_queue.open_queue(args.queue)
+        queued = work_queue.enqueue(week_number, flyers, requeue_done=args.full)
+        kept = sum(len(pages) for _, _, pages in flyers) - queued
+        write_log(f"[QUEUE] {queued} pages of {len(flyers)} flyers queued in {args.queue or work_queue.QUEUE_PATH}"
+                  + (f" ({kept} already done or leased, kept)" if kept else ""))
+        if args.queue_wait:
+            wait_for_queue(week_number)
+            queue_done = work_queue.done_pages(week_number)
+            for filepath, supermarket, pages in flyers:
+                manifest.record(filepath, supermarket, pages, queue_done.get(os.path.basename(filepath), ()))
+            manifest.save()
+        write_log(f"[QUEUE] Week {week_number} pages: {work_queue.get_stats(week_number)}")
+        work_queue.close_queue()
+        write_log("\n✅ All done.")
+        close_log()
+        return
+
+    # Batch prepare — render everything into Batch API request files, nothing goes to GPT yet
+    if args.batch == "prepare":
+        import batch_mode
+        with ProcessPoolExecutor(max_workers=args.render_workers) as render_pool:
+            set_render_pool(render_pool)
+            batch_mode.prepare(flyers, week_number, parallel_flyers=args.parallel_flyers)
+            set_render_pool(None)
+        image_profiles.log_stats()
+        render_cache.log_stats()
+        write_log("\n✅ All done.")
+        close_log()
+        return
+
+    ensure_schema()
+
+    # Perceptual page index — pages already parsed in an earlier week reuse their offers
+    if not args.no_reuse:
+        page_index.open_index(args.page_index)
+
+    # Process PDFs — all flyers at once: rendering on a process pool, GPT calls on the shared
+    # fair-share API pool, each flyer's log written as one block when it finishes
+    if flyers:
+        parallel_flyers = args.parallel_flyers or len(flyers)
+        with ProcessPoolExecutor(max_workers=args.render_workers) as render_pool:
+            set_render_pool(render_pool)
+            with ThreadPoolExecutor(max_workers=parallel_flyers, thread_name_prefix="flyer") as flyer_pool:
+                futures = {
+                    flyer_pool.submit(process_flyer, filepath, supermarket, week_number, pages): (filepath, supermarket, pages)
+                    for filepath, supermarket, pages in flyers
+                }
+                for future, (filepath, supermarket, pages) in futures.items():
+                    try:
+                        future.result()
+                    except Exception as e:
+                        write_log(f"[ERROR] Failed to process flyer: {filepath} — {e}")
+                    # Outcome → manifest, so the next run of this folder only does what's left
+                    manifest.record(filepath, supermarket, pages, run_journal.done_pages(week_number).get(os.path.basename(filepath), ()))
+                    manifest.save()
+            set_render_pool(None)
+
+    image_profiles.log_stats()
+    log_cache_stats()
+    render_cache.log_stats()
+    render_cache.evict()
+    page_index.log_stats()
+    page_index.close_index()
+    export_metrics(week_number, args.metrics_dir)
+    write_log(f"[JOURNAL] Week {week_number} pages: {run_journal.get_stats(week_number)}")
+    run_journal.close_journal()
+    write_log("\n✅ All done.")
+    close_log()   # flush — nothing queued is lost
+
+
+if __name__ == "__main__":
+    main()
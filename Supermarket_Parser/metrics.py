@@ -0,0 +1,211 @@
+# metrics.py
+
+import os
+import json
+import math
+import time
+import threading
+from datetime import datetime
+from log_writer import write_log
+
+# Per-stage timings and counters of a run, per chain. The parse engine and the DB writer record
+# into one process-wide collector; main.py exports it at the end as a Prometheus textfile (for the
+# node_exporter textfile collector) and a JSON summary, and logs p50 / p95 page latency.
+#   stages   — render (rasterize + image encode, or render cache), encode (base64 data URL),
+#              rate_wait (RPM/TPM limiter), api (one streamed call, retries counted separately),
+#              page (render done → offers parsed), write (one DB batch insert + commit)
+#   counters — pages, pages_failed, api_calls, retries, cache_hits, bytes_uploaded,
+#              prompt_tokens, cached_tokens, completion_tokens, cost_usd, offers, offers_inserted, offers_skipped
+#   info     — per chain, e.g. prompt_version (exported as a Prometheus info metric)
+METRICS_DIR = "metrics"
+PROMETHEUS_FILE = "supermarket_parser.prom"   # overwritten every run — the textfile collector reads the latest
+METRIC_PREFIX = "supermarket_parser"
+QUANTILES = (0.5, 0.95)
+
+ALL_CHAINS = "all"
+
+_lock = threading.Lock()
+_timings = {}      # (chain, stage) → [seconds, ...]
+_counters = {}     # (chain, name) → value
+_info = {}         # (chain, name) → text
+_started = time.time()
+
+
+def reset():
+    global _started
+    with _lock:
+        _timings.clear()
+        _counters.clear()
+        _info.clear()
+        _started = time.time()
+
+
+# One timed stage, e.g. observe("AH", "api", 3.2)
+def observe(chain, stage, seconds):
+    with _lock:
+        _timings.setdefault((chain, stage), []).append(seconds)
+
+
+def count(chain, name, value=1):
+    if not value:
+        return
+    with _lock:
+        _counters[(chain, name)] = _counters.get((chain, name), 0) + value
+
+
+# A text value of a chain, e.g. set_info("AH", "prompt_version", "ah_v1")
+def set_info(chain, name, value):
+    with _lock:
+        _info[(chain, name)] = value
+
+
+# Helper — nearest-rank percentile of a sorted list
+def percentile(sorted_values, q):
+    if not sorted_values:
+        return None
+    index = max(0, min(len(sorted_values) - 1, math.ceil(q * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def _timing_summary(values):
+    values = sorted(values)
+    summary = {"count": len(values), "sum": round(sum(values), 3)}
+    for q in QUANTILES:
+        summary[f"p{round(q * 100)}"] = round(percentile(values, q), 3)
+    summary["max"] = round(values[-1], 3)
+    return summary
+
+
+# Everything recorded so far → {"run": {...}, "chains": {chain: {...}}}; "run" adds up every chain
+def get_summary():
+    with _lock:
+        timings = {key: list(values) for key, values in _timings.items()}
+        counters = dict(_counters)
+        info = dict(_info)
+        started = _started
+
+    grouped = {}
+    for (chain, stage), values in timings.items():
+        for group in (ALL_CHAINS, chain):
+            grouped.setdefault(group, {"stages": {}, "counters": {}})["stages"].setdefault(stage, []).extend(values)
+    for (chain, name), value in counters.items():
+        for group in (ALL_CHAINS, chain):
+            group_counters = grouped.setdefault(group, {"stages": {}, "counters": {}})["counters"]
+            group_counters[name] = group_counters.get(name, 0) + value
+
+    for group in grouped.values():
+        group["stages"] = {stage: _timing_summary(values) for stage, values in sorted(group["stages"].items())}
+        group["counters"] = {name: round(value, 6) if isinstance(value, float) else value
+                             for name, value in sorted(group["counters"].items())}
+    for (chain, name), value in info.items():
+        grouped.setdefault(chain, {"stages": {}, "counters": {}}).setdefault("info", {})[name] = value
+
+    return {
+        "started_at": datetime.fromtimestamp(started).isoformat(timespec="seconds"),
+        "duration": round(time.time() - started, 3),
+        "run": grouped.pop(ALL_CHAINS, {"stages": {}, "counters": {}}),
+        "chains": dict(sorted(grouped.items())),
+    }
+
+
+# Helper — write via a temp file + rename, so a scraper never reads half a file
+def _write_atomic(path, text):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    with open(temp_path, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(temp_path, path)
+
+
+def _labels(**labels):
+    return "{" + ",".join(f'{key}="{value}"' for key, value in labels.items()) + "}"
+
+
+# Prometheus text exposition format — stage timings as summaries, counters as counters,
+# each with a chain label (chain="all" = whole run) and the week
+def format_prometheus(summary, week_number):
+    prefix = METRIC_PREFIX
+    groups = [(ALL_CHAINS, summary["run"])] + list(summary["chains"].items())
+    lines = [
+        f"# HELP {prefix}_stage_seconds Time spent per pipeline stage",
+        f"# TYPE {prefix}_stage_seconds summary",
+    ]
+    for chain, group in groups:
+        for stage, stats in group["stages"].items():
+            for q in QUANTILES:
+                lines.append(f"{prefix}_stage_seconds{_labels(week=week_number, chain=chain, stage=stage, quantile=q)} {stats[f'p{round(q * 100)}']}")
+            lines.append(f"{prefix}_stage_seconds_sum{_labels(week=week_number, chain=chain, stage=stage)} {stats['sum']}")
+            lines.append(f"{prefix}_stage_seconds_count{_labels(week=week_number, chain=chain, stage=stage)} {stats['count']}")
+
+    names = sorted({name for _, group in groups for name in group["counters"]})
+    for name in names:
+        lines.append(f"# TYPE {prefix}_{name}_total counter")
+        for chain, group in groups:
+            if name in group["counters"]:
+                lines.append(f"{prefix}_{name}_total{_labels(week=week_number, chain=chain)} {group['counters'][name]}")
+
+    info_names = sorted({name for _, group in groups for name in group.get("info", {})})
+    for name in info_names:
+        lines.append(f"# TYPE {prefix}_{name}_info gauge")
+        for chain, group in groups:
+            if name in group.get("info", {}):
+                lines.append(f"{prefix}_{name}_info{_labels(week=week_number, chain=chain, **{name: group['info'][name]})} 1")
+
+    lines.append(f"# TYPE {prefix}_run_duration_seconds gauge")
+    lines.append(f"{prefix}_run_duration_seconds{_labels(week=week_number)} {summary['duration']}")
+    lines.append(f"# TYPE {prefix}_last_run_timestamp_seconds gauge")
+    lines.append(f"{prefix}_last_run_timestamp_seconds{_labels(week=week_number)} {round(time.time())}")
+    return "\n".join(lines) + "\n"
+
+
+# End of a run: Prometheus textfile + JSON summary in metrics_dir → (prom_path, json_path)
+def export(week_number, metrics_dir=None):
+    metrics_dir = metrics_dir or METRICS_DIR
+    summary = get_summary()
+    summary["week"] = week_number
+
+    prom_path = os.path.join(metrics_dir, PROMETHEUS_FILE)
+    _write_atomic(prom_path, format_prometheus(summary, week_number))
+
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    json_path = os.path.join(metrics_dir, f"run_week_{week_number}_{timestamp}.json")
+    _write_atomic(json_path, json.dumps(summary, indent=2, ensure_ascii=False) + "\n")
+    return prom_path, json_path
+
+
+# Final summary lines for the log — p50 / p95 page latency and where the time went
+def log_summary(summary=None):
+    summary = summary or get_summary()
+    run = summary["run"]
+    page = run["stages"].get("page")
+    if page:
+        write_log(f"[METRICS] Page latency: p50 {page['p50']:.2f}s, p95 {page['p95']:.2f}s, max {page['max']:.2f}s ({page['count']} pages)")
+    for stage, stats in run["stages"].items():
+        if stage != "page":
+            write_log(f"[METRICS] {stage}: {stats['count']}x, {stats['sum']:.1f}s total, p50 {stats['p50']:.2f}s, p95 {stats['p95']:.2f}s")
+    run_counters = run["counters"]
+    if run_counters.get("prompt_tokens"):
+        write_log(f"[METRICS] Cost: ${run_counters.get('cost_usd', 0):.4f} for {run_counters['prompt_tokens']}+{run_counters.get('completion_tokens', 0)} tokens, "
+                  f"{run_counters.get('cached_tokens', 0) / run_counters['prompt_tokens']:.0%} of prompt tokens from the prompt cache")
+    for chain, group in summary["chains"].items():
+        counters = group["counters"]
+        chain_page = group["stages"].get("page")
+        latency = f", p50 {chain_page['p50']:.2f}s / p95 {chain_page['p95']:.2f}s per page" if chain_page else ""
+        prompt_tokens = counters.get("prompt_tokens", 0)
+        cached = f" ({counters.get('cached_tokens', 0) / prompt_tokens:.0%} of prompt tokens cached)" if prompt_tokens else ""
+        version = group.get("info", {}).get("prompt_version")
+        prompt = f"prompt {version}, " if version else ""
+        write_log(
+            f"[METRICS] {chain}: {prompt}{counters.get('pages', 0)} pages, {counters.get('api_calls', 0)} API calls "
+            f"({counters.get('retries', 0)} retries), {prompt_tokens}+{counters.get('completion_tokens', 0)} tokens{cached}, "
+            f"${counters.get('cost_usd', 0):.4f}, {counters.get('bytes_uploaded', 0) / 1024 / 1024:.1f} MB uploaded{latency}"
+        )
+        small = group["stages"].get("tier_small")
+        large = group["stages"].get("tier_large") or run["stages"].get("tier_large")   # no MODEL page in this chain → run-wide p50
+        if small or counters.get("escalations"):
+            # Time saved = small-tier pages × (p50 of a MODEL page − p50 of a small-model page)
+            saved = f", ~{small['count'] * (large['p50'] - small['p50']):.1f}s saved (p50 {small['p50']:.2f}s small vs {large['p50']:.2f}s large)" if small and large else ""
+            write_log(
+                f"[CASCADE] {chain}: {counters.get('tier_small_pages', 0)} pages by the small model, "
+                f"{counters.get('escalations', 0)} escalated{saved}"
+            )
@@ -0,0 +1,681 @@
+# parsers/base_parser.py
+
+import pdfplumber
+from datetime import datetime
+from dateutil import parser
+import time
+import hashlib
+import threading
+from contextvars import copy_context
+from log_writer import write_log, log_event
+import run_journal
+import metrics
+from parsers.openai_client import get_client, usage_cost
+from parsers.dispatch import dispatch_pages, estimate_tokens, estimate_text_tokens, estimate_pack_tokens, wait_for_rate_limit
+from parsers import retry_policy
+from parsers.retry_policy import RequeuePage
+from parsers.rendering import render_page_image
+from parsers.image_profiles import get_profile as get_image_profile, to_data_url
+from parsers.llm_cache import make_key as make_cache_key, get_response as get_cached_response, store_response as store_cached_response
+from parsers import tiling as page_tiling
+from parsers import text_layer as page_text
+from parsers import page_index
+from parsers import packing as page_packing
+from parsers import cascade as model_cascade
+from parsers import offer_values
+from parsers.json_stream import JsonArrayStream, parse_array as parse_json_array
+
+# _request_json result when the answer was cut off at max_tokens and the caller can tile instead
+TRUNCATED = "length"
+
+# Helper — sanitize and format date field
+def safe_date(val, default="2025-06-24"):
+    try:
+        if val is None or str(val).strip() == "":
+            return default
+        dt = parser.parse(str(val), dayfirst=True)
+        return dt.strftime("%Y-%m-%d")
+    except:
+        return default
+
+# Helper — safe strip for string fields
+def safe_strip(val):
+    if val is None:
+        return ""
+    return str(val).strip()
+
+# Helper — bytes of page content in a request (image data URLs + text), for the upload metrics
+def payload_size(request):
+    content = request["messages"][1]["content"]
+    if isinstance(content, str):
+        return len(content)
+    return sum(len(part["image_url"]["url"]) if part["type"] == "image_url" else len(part["text"]) for part in content)
+
+
+# Raised when on_offers (the DB writer) fails — it's not the request that failed, so the page
+# stops right away instead of being retried (another API call wouldn't get the offers stored)
+class OfferSinkError(Exception):
+    def __init__(self, page_number, error):
+        super().__init__(f"page {page_number}: offer writer failed: {error}")
+        self.page_number = page_number
+        self.error = error
+
+
+# One page's offers as they stream in — from the whole-page answer, its retries and its tiles.
+# Items are normalized once, repeats are dropped (a retry re-sends what the cut-off attempt already
+# delivered, neighbouring tiles overlap) and every new offer is handed to on_offers right away.
+class PageOffers:
+    def __init__(self, flyer_parser, filepath, page_number, on_offers=None):
+        self.flyer_parser = flyer_parser
+        self.filepath = filepath
+        self.page_number = page_number
+        self.on_offers = on_offers
+        self.offers = []
+        self.duplicates = 0
+        self.attempts = 0        # API calls made for the page (tiles and retries included)
+        self.failed = False      # logged as [SKIP_PAGE]
+        self.next_attempt = 0    # whole-page attempt to go on with after the page was requeued
+        self.tiled = False       # set by start_tiling() — the page is asked for in tiles
+        self._seen = set()
+        self._lock = threading.Lock()
+
+    def count_attempt(self):
+        with self._lock:
+            self.attempts += 1
+
+    # Tiled pages merge on product + price (a product cut by a tile edge can differ in its other
+    # fields), all other pages only drop exact repeats
+    def _key(self, offer):
+        if self.tiled:
+            return page_tiling.offer_key(offer)
+        return tuple(offer[field] for field in ("ProductName", "OfferType", "OriginalPrice", "OfferPrice"))
+
+    # The page goes on in tiles — offers so far (e.g. of a whole-page answer cut off at max_tokens)
+    # are keyed the tile way too, so the tiles don't repeat them
+    def start_tiling(self):
+        with self._lock:
+            self.tiled = True
+            self._seen = {self._key(offer) for offer in self.offers}
+
+    def add_all(self, items):
+        new_offers = []
+        for item in items:
+            offer = self.flyer_parser.normalize_offer(item, self.filepath, self.page_number)
+            key = self._key(offer)
+            with self._lock:
+                if key in self._seen:
+                    self.duplicates += 1
+                    continue
+                self._seen.add(key)
+                self.offers.append(offer)
+            new_offers.append(offer)
+        if new_offers and self.on_offers is not None:
+            try:
+                self.on_offers(self.page_number, new_offers)
+            except Exception as e:
+                raise OfferSinkError(self.page_number, e) from e
+
+
+# Shared parsing engine — the chain parsers only bring their prompt and settings.
+# Render → GPT → JSON cleanup → normalization is the same for every supermarket.
+class BaseFlyerParser:
+    def __init__(self, chain, system_prompt, model="gpt-4o", image_profile=None, max_tokens=4000, max_retries=3,
+                 tiling=False, tile_grid=None, text_layer=False, text_model=None, prompt_version=None, pack_pages=1,
+                 cascade_model=None):
+        self.chain = chain
+        self.system_prompt = system_prompt
+        self.prompt_version = prompt_version or chain.lower()   # parser_versioning/ file, see parsers/prompts.py
+        self.model = model
+        self.image_profile = image_profile
+        self.max_tokens = max_tokens
+        self.max_retries = max_retries
+        self.tiling = tiling                        # dense / cut-off pages → overlapping tiles (parsers/tiling.py)
+        self.tile_grid = tile_grid or page_tiling.TILE_GRID
+        self.text_layer = text_layer                # pages with a usable text layer go as text (parsers/text_layer.py)
+        self.text_model = text_model or model
+        self.pack_pages = pack_pages                # sparse pages per request (parsers/packing.py), 1 = off
+        self.cascade_model = cascade_model          # small model tried first, MODEL only for pages it fails (parsers/cascade.py)
+        # Perceptual page index (parsers/page_index.py) — offers are only reused for the same chain, prompt and model
+        self.index_scope = f"{chain}/{model}/{hashlib.sha256(system_prompt.encode('utf-8')).hexdigest()[:16]}"
+
+    # Helper — GPT item → offer row
+    def normalize_offer(self, item, filepath, true_page_num):
+        offer_type_raw = safe_strip(item.get("OfferType"))
+        offer_type_normalized = offer_type_raw.replace(" korting", "").replace("%korting", "%").strip()
+        original_price = safe_strip(item.get("OriginalPrice"))
+        offer_price = safe_strip(item.get("OfferPrice"))
+
+        return {
+            "ProductName": safe_strip(item.get("ProductName")),
+            "OfferType": offer_type_normalized,
+            "OriginalPrice": original_price,
+            "OfferPrice": offer_price,
+            "SourcePDF": filepath.split("\\")[-1],
+            "InsertedAt": datetime.now().strftime("%d-%m-%Y"),
+            "PageNumber": true_page_num,
+            # Typed columns — decimal prices, OfferKind, Quantity (parsers/offer_values.py)
+            **offer_values.typed_values(offer_type_normalized, original_price, offer_price)
+        }
+
+    # Render one page — runs in the flyer thread, pages are handed to the dispatch pool afterwards.
+    # With the text-layer switch on, a page whose text layer is usable isn't rendered at all: it
+    # goes as text (rendered["text"]); text_layer=False forces the image.
+    def render_page(self, filepath, true_page_num, page, text_layer=None):
+        use_text = self.text_layer if text_layer is None else text_layer
+        if use_text:
+            rendered = self.extract_text_page(true_page_num, page)
+            if rendered is not None:
+                return rendered
+
+        write_log(f"[INFO] Page {true_page_num}: Sending to GPT-4 Vision...", page=true_page_num, stage="render")
+        started = time.monotonic()
+
+        # Render + encode the page with this chain's image profile — from the render cache, else on the shared render pool
+        profile = get_image_profile(self.image_profile)
+        image_bytes, image_size = render_page_image(filepath, true_page_num, page, profile)
+        encode_started = time.monotonic()
+        metrics.observe(self.chain, "render", encode_started - started)
+        image_url = to_data_url(image_bytes, profile)
+        metrics.observe(self.chain, "encode", time.monotonic() - encode_started)
+        write_log(
+            f"[INFO] Page {true_page_num}: {len(image_url) // 1024} KB image ({profile['name']}, {image_size[0]}x{image_size[1]})",
+            page=true_page_num, stage="render", duration=round(time.monotonic() - started, 3)
+        )
+        cache_key = make_cache_key(image_bytes, self.system_prompt, self.model)
+
+        # Same page as in an earlier flyer → its offers are reused, no API call (see _request_page)
+        fingerprint = match = None
+        if page_index.is_open():
+            fingerprint = page_index.fingerprint(image_bytes, page)
+            match = page_index.find(self.index_scope, fingerprint)
+        if match is not None:
+            write_log(
+                f"[REUSE] Page {true_page_num}: same as {match['chain']} week {match['week']} page {match['page']} "
+                f"(distance {match['distance']}) — {len(match['offers'])} offers reused, no API call",
+                page=true_page_num, stage="render"
+            )
+        return {
+            "image_url": image_url,
+            "estimated_tokens": estimate_tokens(image_size, max_tokens=self.max_tokens),
+            "cache_key": cache_key,
+            "image": image_bytes,
+            "profile": profile,
+            "prices": page_tiling.count_prices(page) if self.tiling or self.pack_pages > 1 or self.cascade_model else 0,
+            "text": None,
+            "fingerprint": fingerprint,
+            "reused": match,
+            "path": "image" if match is None else "reused"
+        }
+
+    # Text-layer fast path — the page as "x,y: words" text, or None when it has to go as an image
+    def extract_text_page(self, true_page_num, page):
+        started = time.monotonic()
+        text, info = page_text.extract_layout(page)
+        metrics.observe(self.chain, "text_extract", time.monotonic() - started)
+        if text is None:
+            write_log(f"[TEXT] Page {true_page_num}: no usable text layer ({info}) — sending the image", page=true_page_num, stage="render")
+            return None
+
+        write_log(
+            f"[TEXT] Page {true_page_num}: text layer ({info['words']} words, {info['prices']} prices, {len(text) // 1024} KB) — sending text to {self.text_model}",
+            page=true_page_num, stage="render", duration=round(time.monotonic() - started, 3)
+        )
+        return {
+            "text": text,
+            "estimated_tokens": estimate_text_tokens(text, max_tokens=self.max_tokens),
+            "cache_key": make_cache_key(text.encode("utf-8"), self.system_prompt, self.text_model),
+            "prices": info["prices"],
+            "path": "text"
+        }
+
+    # Helper — render a page that went as text after all (vision fallback). Runs on the dispatch
+    # pool, so it opens its own pdfplumber handle — pages are not thread-safe.
+    def _render_image_page(self, filepath, true_page_num):
+        with pdfplumber.open(filepath) as pdf:
+            return self.render_page(filepath, true_page_num, pdf.pages[true_page_num - 1], text_layer=False)
+
+    # Chat completions request for one page image — also the body of a Batch API request line
+    def build_request(self, image_url, note=None, model=None):
+        request = {
+            "model": model or self.model,
+            "messages": [
+                {
+                    "role": "system",
+                    "content": self.system_prompt
+                },
+                {
+                    "role": "user",
+                    "content": [
+                        {
+                            "type": "image_url",
+                            "image_url": {
+                                "url": image_url
+                            }
+                        }
+                    ]
+                }
+            ],
+            "max_tokens": self.max_tokens,
+            "prompt_cache_key": self.prompt_version
+        }
+        if note:
+            request["messages"][1]["content"].append({"type": "text", "text": note})
+        return request
+
+    # Chat completions request for a pack of pages — each image after its page number, then the
+    # note asking for page-tagged offers (parsers/packing.py)
+    def build_pack_request(self, pages):
+        request = self.build_request(pages[0][1])
+        content = []
+        for true_page_num, image_url in pages:
+            content.append({"type": "text", "text": f"Page {true_page_num}:"})
+            content.append({"type": "image_url", "image_url": {"url": image_url}})
+        content.append({"type": "text", "text": page_packing.PACK_NOTE.format(
+            count=len(pages), pages=", ".join(f"page {true_page_num}" for true_page_num, _ in pages)
+        )})
+        request["messages"][1]["content"] = content
+        return request
+
+    # Chat completions request for one page's text layer (text fast path) — on the text model
+    def build_text_request(self, text):
+        return {
+            "model": self.text_model,
+            "messages": [
+                {
+                    "role": "system",
+                    "content": self.system_prompt
+                },
+                {
+                    "role": "user",
+                    "content": page_text.TEXT_NOTE + "\n\n" + text
+                }
+            ],
+            "max_tokens": self.max_tokens,
+            "prompt_cache_key": self.prompt_version
+        }
+
+    # Token counts + cost of one call (response.usage) → run metrics. cached_tokens = prompt tokens
+    # the API served from its prompt cache (the system prompt prefix), billed at the cached price.
+    def record_usage(self, model, usage, batch=False):
+        details = usage.prompt_tokens_details
+        cached_tokens = (details.cached_tokens or 0) if details is not None else 0
+        metrics.set_info(self.chain, "prompt_version", self.prompt_version)
+        metrics.count(self.chain, "prompt_tokens", usage.prompt_tokens)
+        metrics.count(self.chain, "cached_tokens", cached_tokens)
+        metrics.count(self.chain, "completion_tokens", usage.completion_tokens)
+        cost = usage_cost(model, usage.prompt_tokens, cached_tokens, usage.completion_tokens, batch=batch)
+        if cost is not None:
+            metrics.count(self.chain, "cost_usd", cost)
+
+    # Parse a complete GPT response — the JSON array, with or without ```json fences around it.
+    # None = no complete array in the response.
+    def parse_response(self, response_text):
+        return parse_json_array(response_text)
+
+    # One streamed GPT call with the retry loop. Every offer object goes to the sink the moment it
+    # closes, so offers of an answer that breaks off halfway are kept. Returns True once a complete
+    # array came back, TRUNCATED when stop_on_length is set and the answer hit max_tokens, False
+    # when every attempt failed (or the error can't be fixed by retrying).
+    # Retries back off per parsers/retry_policy.py. With requeue=True the call doesn't wait for its
+    # retry but raises RequeuePage, so dispatch_pages can queue the page again (first_attempt = the
+    # attempt to go on with). max_attempts caps the attempts below max_retries (packs get one).
+    # Only the request is retried: an OfferSinkError from the sink goes straight up to the flyer.
+    def _request_json(self, label, request, estimated_tokens, cache_key, sink, stop_on_length=False,
+                      first_attempt=0, requeue=False, max_attempts=None):
+        # Same image + prompt + model already answered → no API call
+        cached_text = get_cached_response(cache_key) if first_attempt == 0 else None
+        attempts = self.max_retries if max_attempts is None else min(max_attempts, self.max_retries)
+
+        for attempt in range(first_attempt, attempts):
+            stream = JsonArrayStream()
+            started = time.monotonic()
+            try:
+                finish_reason = None
+                if cached_text is not None:
+                    response_text = cached_text
+                    metrics.count(self.chain, "cache_hits")
+                    sink.add_all(stream.feed(response_text))
+                else:
+                    sink.count_attempt()
+                    retry_policy.get_breaker().wait()   # endpoint failing → everyone pauses
+                    wait_for_rate_limit(estimated_tokens)
+                    metrics.observe(self.chain, "rate_wait", time.monotonic() - started)
+                    metrics.count(self.chain, "api_calls")
+                    metrics.count(self.chain, "retries", 1 if attempt else 0)
+                    metrics.count(self.chain, "bytes_uploaded", payload_size(request))
+                    chunks = []
+                    api_started = time.monotonic()
+                    try:
+                        # include_usage → the last chunk carries the token counts (and no choices)
+                        response = get_client().chat.completions.create(
+                            **request, stream=True, stream_options={"include_usage": True}
+                        )
+                        for chunk in response:
+                            if chunk.usage is not None:
+                                self.record_usage(request["model"], chunk.usage)
+                            if not chunk.choices:
+                                continue
+                            choice = chunk.choices[0]
+                            if choice.delta is not None and choice.delta.content:
+                                chunks.append(choice.delta.content)
+                                sink.add_all(stream.feed(choice.delta.content))
+                            if choice.finish_reason:
+                                finish_reason = choice.finish_reason
+                    finally:
+                        metrics.observe(self.chain, "api", time.monotonic() - api_started)
+                    retry_policy.record_result()
+                    response_text = "".join(chunks)
+
+                if stream.closed:
+                    write_log(f"[INFO] Parsed {stream.items} items from {label}.",
+                              page=sink.page_number, stage="request", duration=round(time.monotonic() - started, 3))
+                    if cached_text is None:
+                        store_cached_response(cache_key, request["model"], response_text)
+                    return True  # success → exit retry loop
+                if stop_on_length and finish_reason == "length":
+                    write_log(f"[INFO] {label[0].upper()}{label[1:]}: answer cut off at max_tokens after {stream.items} items",
+                              page=sink.page_number, stage="request", duration=round(time.monotonic() - started, 3))
+                    return TRUNCATED
+                raise ValueError(f"no complete JSON array in response (finish_reason={finish_reason})")
+
+            except OfferSinkError:
+                raise
+            except Exception as e:
+                cached_text = None  # retries always go to the API
+                retry_policy.record_result(e)
+                kept = f" ({stream.items} items kept)" if stream.items else ""
+                write_log(f"[ERROR] {label[0].upper()}{label[1:]} attempt {attempt+1}: {e}{kept}",
+                          page=sink.page_number, stage="request", duration=round(time.monotonic() - started, 3))
+                if attempt == attempts - 1 or not retry_policy.is_retryable(e):
+                    return False
+                delay = retry_policy.backoff_delay(attempt + 1, e)
+                if requeue:
+                    write_log(f"[RETRY] {label[0].upper()}{label[1:]}: requeued, attempt {attempt+2} in {delay:.1f}s",
+                              page=sink.page_number, stage="request")
+                    metrics.count(self.chain, "requeues")
+                    raise RequeuePage(delay, attempt + 1)
+                time.sleep(delay)
+
+        return False
+
+    # Send one rendered page to GPT — runs on the dispatch pool, several pages in flight.
+    # on_offers(page_number, offers) receives the page's offers while they stream in.
+    def request_page(self, filepath, true_page_num, rendered, on_offers=None):
+        return self._request_page(filepath, true_page_num, rendered, on_offers).offers
+
+    # Same as request_page, returns the page's PageOffers (offers, attempts, failed). With
+    # requeue=True a failed whole-page attempt raises RequeuePage instead of waiting for its retry;
+    # call again with the same sink to go on (tiles always retry in place).
+    # A text-layer page whose answer fails or is cut off is rendered after all and goes the image
+    # way below (rendered is updated in place, rendered["path"] = "fallback").
+    def _request_page(self, filepath, true_page_num, rendered, on_offers=None, sink=None, requeue=False):
+        if sink is None:
+            sink = PageOffers(self, filepath, true_page_num, on_offers)
+
+        if rendered["text"] is not None:
+            try:
+                result = self._request_json(
+                    f"page {true_page_num} (text layer)", self.build_text_request(rendered["text"]),
+                    rendered["estimated_tokens"], rendered["cache_key"], sink,
+                    stop_on_length=True, first_attempt=sink.next_attempt, requeue=requeue
+                )
+            except RequeuePage as e:
+                sink.next_attempt = e.attempt
+                raise
+            if result is True:
+                return sink
+            reason = "cut off at max_tokens" if result is TRUNCATED else "failed"
+            write_log(f"[TEXT] Page {true_page_num}: text-layer answer {reason} — sending the image", page=true_page_num, stage="render")
+            rendered.update(self._render_image_page(filepath, true_page_num))
+            if rendered["path"] != "reused":
+                rendered["path"] = "fallback"
+            sink.next_attempt = 0
+
+        # Page matched one in the page index (render_page) — its offers, no API call
+        if rendered["path"] == "reused":
+            sink.add_all(rendered["reused"]["offers"])
+            return sink
+
+        if self.tiling and rendered["prices"] >= page_tiling.DENSE_PAGE_PRICES:
+            write_log(f"[TILE] Page {true_page_num}: dense page ({rendered['prices']} prices) — sending tiles", page=true_page_num, stage="tile")
+            self.request_tiles(filepath, true_page_num, rendered, sink)
+            return sink
+
+        # Model cascade — the small model first, this page's MODEL only if its answer fails validation
+        if self.cascade_model and "tier" not in rendered and self._request_small_tier(true_page_num, rendered, sink):
+            return sink
+
+        started = time.monotonic()
+        try:
+            result = self._request_json(
+                f"page {true_page_num}", self.build_request(rendered["image_url"]), rendered["estimated_tokens"], rendered["cache_key"], sink,
+                stop_on_length=self.tiling, first_attempt=sink.next_attempt, requeue=requeue
+            )
+        except RequeuePage as e:
+            sink.next_attempt = e.attempt
+            raise
+        if result is True:
+            metrics.observe(self.chain, "tier_large", time.monotonic() - started)   # baseline for the cascade's time saved
+        if result is TRUNCATED:
+            write_log(f"[TILE] Page {true_page_num}: response hit max_tokens — sending tiles", page=true_page_num, stage="tile")
+            self.request_tiles(filepath, true_page_num, rendered, sink)
+        elif not result:
+            sink.failed = True
+            pdf_name = filepath.split("\\")[-1]
+            write_log(f"[SKIP_PAGE] {true_page_num} {pdf_name}", page=true_page_num, stage="skip")
+        return sink
+
+    # Small tier of the model cascade (parsers/cascade.py): one attempt on cascade_model into a
+    # buffer. True = the answer passed validation and its offers went to the sink; False = the
+    # page is escalated to MODEL (rendered["tier"] = "large").
+    def _request_small_tier(self, true_page_num, rendered, sink):
+        started = time.monotonic()
+        buffer = model_cascade.ItemBuffer(sink)
+        result = self._request_json(
+            f"page {true_page_num} ({self.cascade_model})", self.build_request(rendered["image_url"], model=self.cascade_model),
+            rendered["estimated_tokens"], make_cache_key(rendered["image"], self.system_prompt, self.cascade_model), buffer,
+            stop_on_length=True, max_attempts=1
+        )
+        if result is True:
+            problems = model_cascade.validate(buffer.items, rendered["prices"])
+        else:
+            problems = ["answer cut off at max_tokens" if result is TRUNCATED else "request failed"]
+
+        if not problems:
+            rendered["tier"] = "small"
+            metrics.observe(self.chain, "tier_small", time.monotonic() - started)
+            metrics.count(self.chain, "tier_small_pages")
+            sink.add_all(buffer.items)
+            return True
+        rendered["tier"] = "large"
+        metrics.count(self.chain, "escalations")
+        write_log(f"[CASCADE] Page {true_page_num}: {self.cascade_model} answer rejected ({'; '.join(problems)}) — escalating to {self.model}",
+                  page=true_page_num, stage="cascade")
+        return False
+
+    # Dense page: overlapping tiles asked for in parallel, all streaming into the page's sink, which
+    # drops the overlap duplicates (same product + price). A tile that fails marks the whole page
+    # [SKIP_PAGE]; the offers of the other tiles are kept.
+    def request_tiles(self, filepath, true_page_num, rendered, sink):
+        profile = rendered["profile"]
+        tiles = page_tiling.split_page(rendered["image"], profile, grid=self.tile_grid)
+        sink.start_tiling()
+        duplicates_before = sink.duplicates
+
+        futures = []
+        for index, (tile_bytes, tile_size) in enumerate(tiles, start=1):
+            note = page_tiling.TILE_NOTE.format(index=index, count=len(tiles))
+            futures.append(page_tiling.get_tile_pool().submit(
+                copy_context().run, self._request_json,
+                f"page {true_page_num} tile {index}/{len(tiles)}",
+                self.build_request(to_data_url(tile_bytes, profile), note),
+                estimate_tokens(tile_size, max_tokens=self.max_tokens),
+                make_cache_key(tile_bytes, self.system_prompt, self.model),
+                sink
+            ))
+        failed = sum(1 for future in futures if not future.result())
+
+        write_log(
+            f"[TILE] Page {true_page_num}: {len(tiles)} tiles → {len(sink.offers)} items ({sink.duplicates - duplicates_before} overlap duplicates dropped)",
+            page=true_page_num, stage="tile"
+        )
+        if failed:
+            sink.failed = True
+            pdf_name = filepath.split("\\")[-1]
+            write_log(f"[SKIP_PAGE] {true_page_num} {pdf_name}", page=true_page_num, stage="skip")
+
+    # Request one page and record it in the run journal. The page only counts as done once its
+    # offers are safe: on_page_done(page_number, finish) lets the DB writer call finish(ok) after
+    # the commit; without it the page is done as soon as it parsed.
+    # A page whose request failed is requeued by dispatch_pages (RequeuePage) and comes back here
+    # with the same rendered dict, which keeps its sink (offers so far, next attempt) and start time.
+    def _journaled_request(self, filepath, week_number, true_page_num, rendered, on_page, on_page_done):
+        sink = self._start_page(filepath, week_number, true_page_num, rendered, on_page)
+        self._request_page(filepath, true_page_num, rendered, sink=sink, requeue=True)
+        return self._finish_page(filepath, week_number, true_page_num, rendered, on_page_done)
+
+    # Helper — journal the page as started and give it its sink (kept in rendered across requeues)
+    def _start_page(self, filepath, week_number, true_page_num, rendered, on_page):
+        sink = rendered.get("sink")
+        if sink is None:
+            run_journal.page_started(week_number, filepath, true_page_num)
+            rendered["started"] = time.monotonic()
+            sink = rendered["sink"] = PageOffers(self, filepath, true_page_num, on_page)
+        return sink
+
+    # Helper — a page's last offers are in: page index, metrics, journal → the page's offers
+    def _finish_page(self, filepath, week_number, true_page_num, rendered, on_page_done):
+        sink = rendered["sink"]
+        if rendered.get("fingerprint") is not None and rendered["path"] != "reused" and not sink.failed:
+            page_index.add_page(self.index_scope, self.chain, week_number, filepath.split("\\")[-1], true_page_num,
+                                rendered["fingerprint"], sink.offers)
+        duration = time.monotonic() - rendered["started"]
+        log_event("page", page=true_page_num, offers=len(sink.offers), api_calls=sink.attempts,
+                  failed=sink.failed, duration=round(duration, 3))
+        metrics.observe(self.chain, "page", duration)
+        metrics.count(self.chain, "pages")
+        metrics.count(self.chain, "pages_failed", 1 if sink.failed else 0)
+        metrics.count(self.chain, "offers", len(sink.offers))
+        metrics.count(self.chain, f"{rendered['path']}_pages")   # text / image / fallback / reused / packed _pages
+
+        def finish(ok):
+            run_journal.page_finished(week_number, filepath, true_page_num, ok, offers=len(sink.offers), attempts=sink.attempts)
+
+        if sink.failed:
+            finish(False)
+        elif on_page_done is not None:
+            on_page_done(true_page_num, finish)
+        else:
+            finish(True)
+        return sink.offers
+
+    # Helper — can this page go in a pack? Only plain image pages that aren't dense
+    def _packable(self, rendered):
+        if rendered["path"] != "image" or rendered["prices"] >= page_packing.PACK_MAX_PRICES:
+            return False
+        return not (self.tiling and rendered["prices"] >= page_tiling.DENSE_PAGE_PRICES)
+
+    # One packed request for several pages (parsers/packing.py), a single attempt → the page numbers
+    # it answered. When the answer is complete and every offer is tagged, the pages that got offers
+    # are delivered to their sinks; pages without offers, and all pages of a pack that failed, are
+    # left for the caller to send one by one.
+    def _request_pack(self, filepath, week_number, pages, on_page):
+        sinks = {true_page_num: self._start_page(filepath, week_number, true_page_num, rendered, on_page)
+                 for true_page_num, rendered in pages}
+        pack_sink = page_packing.PackOffers(sinks)
+        page_list = ", ".join(str(true_page_num) for true_page_num, _ in pages)
+        label = f"pages {page_list} (packed)"
+        write_log(f"[PACK] Pages {page_list}: {len(pages)} sparse pages in one request", page=pack_sink.page_number, stage="pack")
+
+        cache_input = f"pack {page_list}\0".encode("utf-8") + b"".join(rendered["image"] for _, rendered in pages)
+        result = self._request_json(
+            label, self.build_pack_request([(true_page_num, rendered["image_url"]) for true_page_num, rendered in pages]),
+            estimate_pack_tokens([rendered["estimated_tokens"] for _, rendered in pages], max_tokens=self.max_tokens),
+            make_cache_key(cache_input, self.system_prompt, self.model), pack_sink,
+            stop_on_length=True, max_attempts=1
+        )
+        if result is True and not pack_sink.untagged:
+            answered = [true_page_num for true_page_num, _ in pages if pack_sink.items[true_page_num]]
+            pack_sink.deliver(answered)
+            for true_page_num, rendered in pages:
+                if true_page_num in answered:
+                    rendered["path"] = "packed"
+            counts = ", ".join(f"page {true_page_num}: {len(pack_sink.items[true_page_num])}" for true_page_num in sinks)
+            write_log(f"[PACK] Pages {page_list}: split into {counts} offers", page=pack_sink.page_number, stage="pack")
+            empty = [str(true_page_num) for true_page_num, _ in pages if true_page_num not in answered]
+            if empty:
+                write_log(f"[PACK] Page{'s' if len(empty) > 1 else ''} {', '.join(empty)}: no offers in the pack's answer — sending on its own",
+                          page=pack_sink.page_number, stage="pack")
+                metrics.count(self.chain, "pack_fallbacks", len(empty))
+            return answered
+
+        if result is TRUNCATED:
+            reason = "answer cut off at max_tokens"
+        elif result is True:
+            reason = f"{pack_sink.untagged} offers without a page of the pack"
+        else:
+            reason = "request failed"
+        write_log(f"[PACK] Pages {page_list}: {reason} — sending the pages one by one", page=pack_sink.page_number, stage="pack")
+        metrics.count(self.chain, "pack_fallbacks", len(pages))
+        return []
+
+    # One dispatch unit: a single page, or up to pack_pages pages of which the packable ones share
+    # one request. Pages of a pack that didn't work out, and pages that can't be packed, go the
+    # normal single-page way. Finished pages are kept in unit["offers"], so a unit that comes back
+    # after a RequeuePage only requests the pages that are left.
+    def _request_unit(self, filepath, week_number, unit, on_page, on_page_done):
+        if not unit["pack_tried"]:
+            unit["pack_tried"] = True
+            packable = [(true_page_num, rendered) for true_page_num, rendered in unit["pages"] if self._packable(rendered)]
+            answered = self._request_pack(filepath, week_number, packable, on_page) if len(packable) > 1 else []
+            for true_page_num, rendered in packable:
+                if true_page_num in answered:
+                    unit["offers"][true_page_num] = self._finish_page(filepath, week_number, true_page_num, rendered, on_page_done)
+
+        for true_page_num, rendered in unit["pages"]:
+            if true_page_num not in unit["offers"]:
+                unit["offers"][true_page_num] = self._journaled_request(filepath, week_number, true_page_num, rendered, on_page, on_page_done)
+        return [offer for true_page_num, _ in unit["pages"] for offer in unit["offers"][true_page_num]]
+
+    # on_page(page_number, offers) gets offers as soon as GPT streams them in (e.g. the DB writer) —
+    # several calls per page, each with the offers that are new. on_page_done(page_number, finish)
+    # is called once per page after its last offers (see _journaled_request).
+    def parse_pdf(self, filepath, week_number, pages_to_parse=None, on_page=None, on_page_done=None):
+        offers = []
+        write_log(f"\n=== Parsing {self.chain} PDF with GPT-4 Vision: {filepath} ===")
+
+        with pdfplumber.open(filepath) as pdf:
+            pages = pdf.pages
+
+            if pages_to_parse:
+                pages_to_parse = [p-1 for p in pages_to_parse]  # 0-based
+                selected_pages = [(p+1, pages[p]) for p in pages_to_parse if 0 <= p < len(pages)]
+            else:
+                selected_pages = [(i+1, p) for i, p in enumerate(pages[:2])]  # First 2 pages only
+            run_journal.add_pages(week_number, filepath, self.chain, [true_page_num for true_page_num, _ in selected_pages])
+
+            page_paths = []   # "text" / "image" / "fallback" / "reused" / "packed" per finished page
+
+            # Pages go to the dispatch pool in units — one page, or a pack of sparse pages with
+            # PACK_PAGES > 1. A unit renders its pages together and takes one slot.
+            def render_unit(first_page_num, unit):
+                rendered_pages = [(true_page_num, self.render_page(filepath, true_page_num, page)) for true_page_num, page in unit]
+                return {"pages": rendered_pages, "pack_tried": False, "offers": {}}
+
+            def request_unit(first_page_num, unit):
+                unit_offers = self._request_unit(filepath, week_number, unit, on_page, on_page_done)
+                page_paths.extend(rendered["path"] for _, rendered in unit["pages"])
+                return unit_offers
+
+            # Offers come back in page order, whatever order the requests finished in
+            units = page_packing.group_pages(selected_pages, self.pack_pages)
+            unit_results = dispatch_pages([(unit[0][0], unit) for unit in units], render_unit, request_unit)
+            for unit_offers in unit_results:
+                offers.extend(unit_offers)
+
+        if self.text_layer or "reused" in page_paths or "packed" in page_paths:
+            write_log(f"[PATHS] {self.chain}: {page_paths.count('text')} pages as text, {page_paths.count('image')} as image, "
+                      f"{page_paths.count('fallback')} fell back from text to image, {page_paths.count('reused')} reused from earlier flyers, "
+                      f"{page_paths.count('packed')} packed")
+        write_log(f"\n✅ Total offers parsed from {self.chain} PDF: {len(offers)}")
+        return offers
@@ -0,0 +1,62 @@
+# parsers/cascade.py
+
+from parsers.offer_values import price_range, offer_kind
+
+# Model cascade. With CASCADE_MODEL set, a page image first goes to that smaller, faster model
+# (one attempt). Its answer is buffered — nothing reaches the DB yet — and checked against the
+# rules below. A page that passes keeps the small model's offers; a page that fails is escalated
+# to the chain's MODEL, which starts from scratch (retries, tiling and requeueing as usual).
+MAX_INVALID_SHARE = 0.1      # share of offers that may break a rule before the page is escalated
+PRICES_PER_OFFER = 3         # text-layer prices per offer at most (offer, original, per-kg) — fewer offers = products missed
+SPECIAL_PRICES = ("not clear",)   # values the prompts allow instead of an OriginalPrice
+
+
+# Problems of one offer (a GPT item), [] when it's fine
+def check_item(item):
+    problems = []
+    if not str(item.get("ProductName") or "").strip():
+        problems.append("empty ProductName")
+    offer_price = price_range(item.get("OfferPrice"))
+    if offer_price is None:
+        problems.append(f"OfferPrice {item.get('OfferPrice')!r} doesn't parse")
+    original = str(item.get("OriginalPrice") or "").strip()
+    original_price = price_range(original)
+    if original_price is None and original.lower() not in SPECIAL_PRICES:
+        problems.append(f"OriginalPrice {item.get('OriginalPrice')!r} doesn't parse")
+    multibuy = offer_kind(item.get("OfferType")) in ("multibuy", "second_half")   # OfferPrice isn't per product
+    if offer_price and original_price and not multibuy and offer_price[0] > original_price[1]:
+        problems.append(f"OfferPrice {item.get('OfferPrice')} above OriginalPrice {original}")
+    return problems
+
+
+# Problems of a whole answer, [] = the small model's offers are kept. prices = prices in the page's
+# text layer (0 for image-only pages, which skips the density check).
+def validate(items, prices=0):
+    if not items:
+        return ["no offers"]
+    problems = []
+    invalid = 0
+    for item in items:
+        item_problems = check_item(item)
+        if item_problems:
+            invalid += 1
+            problems.extend(problem for problem in item_problems if problem not in problems)
+    if invalid > MAX_INVALID_SHARE * len(items):
+        return [f"{invalid} of {len(items)} offers invalid"] + problems[:3]
+    if prices and len(items) < prices / PRICES_PER_OFFER:
+        return [f"{len(items)} offers for {prices} prices in the text layer"]
+    return []
+
+
+# Sink of the small model's answer — keeps the items until they passed validation
+class ItemBuffer:
+    def __init__(self, sink):
+        self.sink = sink
+        self.page_number = sink.page_number
+        self.items = []
+
+    def count_attempt(self):
+        self.sink.count_attempt()
+
+    def add_all(self, items):
+        self.items.extend(items)
@@ -0,0 +1,206 @@
+# parsers/dispatch.py
+
+import contextvars
+import math
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from parsers.retry_policy import RequeuePage
+
+# Dispatch limits — adjust to your OpenAI tier (main.py can override them per run)
+MAX_IN_FLIGHT = 4             # page requests waiting on the API at the same time, across all flyers (1 = serial)
+REQUESTS_PER_MINUTE = 60
+TOKENS_PER_MINUTE = 200000
+
+# Rough size of the system prompt + message overhead, counted towards the token budget
+PROMPT_TOKEN_ALLOWANCE = 1200
+
+_limiter = None
+_limiter_lock = threading.Lock()
+
+# One API pool for the whole run — every flyer that is being parsed shares its slots
+_api_pool = None
+_api_slots = None
+_api_pool_lock = threading.Lock()
+
+
+# Sliding 60-second window over requests and (estimated) tokens — shared by every parser in the process
+class RateLimiter:
+    def __init__(self, requests_per_minute, tokens_per_minute):
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self._lock = threading.Lock()
+        self._window = deque()  # (timestamp, tokens)
+        self._window_tokens = 0
+
+    def acquire(self, tokens):
+        # A single request bigger than the whole budget would wait forever — cap it
+        tokens = min(tokens, self.tokens_per_minute)
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                while self._window and now - self._window[0][0] >= 60:
+                    _, old_tokens = self._window.popleft()
+                    self._window_tokens -= old_tokens
+
+                if (len(self._window) < self.requests_per_minute
+                        and self._window_tokens + tokens <= self.tokens_per_minute):
+                    self._window.append((now, tokens))
+                    self._window_tokens += tokens
+                    return
+
+                wait = 60 - (now - self._window[0][0])
+            time.sleep(max(wait, 0.05))
+
+
+# In-flight request slots split fairly between the flyers being parsed at the same time.
+# Each flyer may hold at most ceil(capacity / active flyers) slots, so one 60-page flyer
+# can't take the whole pool while smaller flyers wait; a flyer running alone gets all of it.
+class FairShareSlots:
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self._cond = threading.Condition()
+        self._held = {}  # flyer → slots held
+        self._total = 0
+
+    def register(self, flyer):
+        with self._cond:
+            self._held[flyer] = 0
+            self._cond.notify_all()
+
+    def unregister(self, flyer):
+        with self._cond:
+            self._held.pop(flyer, None)
+            self._cond.notify_all()  # remaining flyers get a bigger share
+
+    def acquire(self, flyer):
+        with self._cond:
+            while True:
+                share = math.ceil(self.capacity / max(1, len(self._held)))
+                if self._total < self.capacity and self._held[flyer] < share:
+                    self._held[flyer] += 1
+                    self._total += 1
+                    return
+                self._cond.wait()
+
+    def release(self, flyer):
+        with self._cond:
+            self._held[flyer] -= 1
+            self._total -= 1
+            self._cond.notify_all()
+
+
+def configure(max_in_flight=None, requests_per_minute=None, tokens_per_minute=None):
+    global MAX_IN_FLIGHT, REQUESTS_PER_MINUTE, TOKENS_PER_MINUTE, _limiter, _api_pool, _api_slots
+    if max_in_flight is not None:
+        MAX_IN_FLIGHT = max(1, max_in_flight)
+    if requests_per_minute is not None:
+        REQUESTS_PER_MINUTE = requests_per_minute
+    if tokens_per_minute is not None:
+        TOKENS_PER_MINUTE = tokens_per_minute
+    with _limiter_lock:
+        _limiter = None  # rebuilt with the new limits on next use
+    with _api_pool_lock:
+        if _api_pool is not None:
+            _api_pool.shutdown(wait=False)
+        _api_pool, _api_slots = None, None
+
+
+def get_api_pool():
+    global _api_pool, _api_slots
+    with _api_pool_lock:
+        if _api_pool is None:
+            _api_pool = ThreadPoolExecutor(max_workers=MAX_IN_FLIGHT, thread_name_prefix="page")
+            _api_slots = FairShareSlots(MAX_IN_FLIGHT)
+        return _api_pool, _api_slots
+
+
+def get_rate_limiter():
+    global _limiter
+    with _limiter_lock:
+        if _limiter is None:
+            _limiter = RateLimiter(REQUESTS_PER_MINUTE, TOKENS_PER_MINUTE)
+        return _limiter
+
+
+# Block until one more API call fits in the per-minute budgets — call right before every request (incl. retries)
+def wait_for_rate_limit(estimated_tokens):
+    get_rate_limiter().acquire(estimated_tokens)
+
+
+# Helper — estimate tokens for one vision request (gpt-4o high detail: 85 + 170 per 512px tile)
+def estimate_tokens(image_size, max_tokens=4000):
+    width, height = image_size
+    scale = min(1.0, 2048 / max(width, height))
+    width, height = width * scale, height * scale
+    scale = min(1.0, 768 / min(width, height))
+    width, height = width * scale, height * scale
+    tiles = math.ceil(width / 512) * math.ceil(height / 512)
+    return 85 + 170 * tiles + PROMPT_TOKEN_ALLOWANCE + max_tokens
+
+
+# Helper — estimate tokens for one packed request from its pages' estimates (one prompt and one
+# max_tokens for the whole pack)
+def estimate_pack_tokens(page_estimates, max_tokens=4000):
+    return sum(page_estimates) - (len(page_estimates) - 1) * (PROMPT_TOKEN_ALLOWANCE + max_tokens)
+
+
+# Helper — estimate tokens for one text-only request (about 3 characters per token for Dutch flyer text)
+def estimate_text_tokens(text, max_tokens=4000):
+    return len(text) // 3 + PROMPT_TOKEN_ALLOWANCE + max_tokens
+
+
+# Render pages in the calling thread (pdfplumber pages are not thread-safe) and run the page
+# requests on the shared API pool, holding at most this flyer's fair share of its slots.
+# A request that raises RequeuePage gives its slot back and asks for one again after the backoff —
+# no slot sleeps through a retry delay. Slots have no FIFO order: the requeued page competes with
+# the pages waiting to render and may get the next free slot before or after them.
+# Returns request results in page order.
+def dispatch_pages(selected_pages, render_page, request_page):
+    pool, slots = get_api_pool()
+    flyer = object()
+    slots.register(flyer)
+
+    def run_request(true_page_num, rendered, page_future):
+        try:
+            result = request_page(true_page_num, rendered)
+        except RequeuePage as requeue:
+            slots.release(flyer)
+            timer = threading.Timer(requeue.delay, contextvars.copy_context().run, (requeue_request, true_page_num, rendered, page_future))
+            timer.daemon = True
+            timer.start()
+            return
+        except BaseException as e:
+            slots.release(flyer)
+            page_future.set_exception(e)
+            return
+        slots.release(flyer)
+        page_future.set_result(result)
+
+    def requeue_request(true_page_num, rendered, page_future):
+        try:
+            slots.acquire(flyer)
+            pool.submit(contextvars.copy_context().run, run_request, true_page_num, rendered, page_future)
+        except BaseException as e:
+            page_future.set_exception(e)
+
+    futures = []
+    try:
+        for true_page_num, page in selected_pages:
+            slots.acquire(flyer)  # backpressure — don't render further ahead than the API can take
+            try:
+                rendered = render_page(true_page_num, page)
+            except Exception:
+                slots.release(flyer)
+                raise
+            # Copy the context so log lines from the pool land in this flyer's log section
+            page_future = Future()
+            futures.append(page_future)
+            pool.submit(contextvars.copy_context().run, run_request, true_page_num, rendered, page_future)
+
+        return [future.result() for future in futures]
+    finally:
+        for future in futures:
+            future.exception()  # wait for stragglers before giving the slots back
+        slots.unregister(flyer)
@@ -0,0 +1,127 @@
+# parsers/image_profiles.py
+
+import io
+import base64
+import threading
+from PIL import Image
+from log_writer import write_log
+
+# How a page image is rendered and encoded before it goes to GPT.
+#   dpi        — pdfplumber render resolution
+#   format     — PNG (lossless), JPEG or WEBP
+#   quality    — JPEG/WEBP start quality (lowered in steps to meet max_bytes)
+#   max_edge   — downscale so the long edge is at most this many pixels (gpt-4o works on ≤2048px anyway)
+#   grayscale  — drop colour
+#   max_bytes  — payload budget for the encoded image (before base64); None = no budget
+PROFILES = {
+    "png300": {"dpi": 300, "format": "PNG", "quality": None, "max_edge": None, "grayscale": False, "max_bytes": None},
+    "png200_2048": {"dpi": 200, "format": "PNG", "quality": None, "max_edge": 2048, "grayscale": False, "max_bytes": None},
+    "jpeg200": {"dpi": 200, "format": "JPEG", "quality": 85, "max_edge": 2048, "grayscale": False, "max_bytes": 1500000},
+    "webp200": {"dpi": 200, "format": "WEBP", "quality": 80, "max_edge": 2048, "grayscale": False, "max_bytes": 800000},
+    "webp150_gray": {"dpi": 150, "format": "WEBP", "quality": 75, "max_edge": 1600, "grayscale": True, "max_bytes": 400000},
+}
+
+DEFAULT_PROFILE = "png300"   # same payload as before profiles existed
+
+MIME_TYPES = {"PNG": "image/png", "JPEG": "image/jpeg", "WEBP": "image/webp"}
+MIN_QUALITY = 50
+
+# Set by main.py --image_profile / compare_profiles.py — wins over the parser's own IMAGE_PROFILE
+PROFILE_OVERRIDE = None
+
+_lock = threading.Lock()
+_payload_stats = {}  # profile name → {"pages": n, "bytes": n}
+
+
+def set_profile_override(name):
+    global PROFILE_OVERRIDE
+    if name is not None and name not in PROFILES:
+        raise ValueError(f"Unknown image profile: {name} (known: {', '.join(PROFILES)})")
+    PROFILE_OVERRIDE = name
+
+
+# Profile for a chain — the run-wide override if one is set, else the chain's own choice
+def get_profile(name=None):
+    name = PROFILE_OVERRIDE or name or DEFAULT_PROFILE
+    return dict(PROFILES[name], name=name)
+
+
+# Helper — short tag for the render cache file name, e.g. "png" or "q85.e2048.b1500000.jpeg"
+def profile_encoding(profile):
+    parts = []
+    if profile["format"] != "PNG" and profile["quality"]:
+        parts.append(f"q{profile['quality']}")
+    if profile["max_edge"]:
+        parts.append(f"e{profile['max_edge']}")
+    if profile["grayscale"]:
+        parts.append("gray")
+    if profile["max_bytes"]:
+        parts.append(f"b{profile['max_bytes']}")
+    parts.append(profile["format"].lower())
+    return ".".join(parts)
+
+
+def _save(image, profile, quality):
+    img_bytes = io.BytesIO()
+    if profile["format"] == "PNG":
+        image.save(img_bytes, format="PNG")
+    else:
+        image.save(img_bytes, format=profile["format"], quality=quality)
+    return img_bytes.getvalue()
+
+
+def _downscale(image, max_edge):
+    width, height = image.size
+    scale = max_edge / max(width, height)
+    if scale >= 1:
+        return image
+    return image.resize((max(1, round(width * scale)), max(1, round(height * scale))), Image.LANCZOS)
+
+
+# Encode a rendered page with the profile. Over budget → step quality down, then shrink the image.
+# Returns (encoded_bytes, (width, height)).
+def encode_image(image, profile):
+    if profile["grayscale"]:
+        image = image.convert("L")
+    elif profile["format"] == "JPEG" and image.mode not in ("RGB", "L"):
+        image = image.convert("RGB")
+    if profile["max_edge"]:
+        image = _downscale(image, profile["max_edge"])
+
+    quality = profile["quality"]
+    data = _save(image, profile, quality)
+    while profile["max_bytes"] and len(data) > profile["max_bytes"]:
+        if profile["format"] != "PNG" and quality > MIN_QUALITY:
+            quality = max(MIN_QUALITY, quality - 10)
+        elif max(image.size) > 512:
+            image = _downscale(image, int(max(image.size) * 0.85))
+        else:
+            break  # can't get smaller without making the page unreadable
+        data = _save(image, profile, quality)
+    return data, image.size
+
+
+# Base64 data URL for the chat request — also counts bytes sent per profile
+def to_data_url(image_bytes, profile):
+    url = f"data:{MIME_TYPES[profile['format']]};base64," + base64.b64encode(image_bytes).decode("utf-8")
+    with _lock:
+        stats = _payload_stats.setdefault(profile["name"], {"pages": 0, "bytes": 0})
+        stats["pages"] += 1
+        stats["bytes"] += len(url)
+    return url
+
+
+def get_payload_stats():
+    with _lock:
+        return {name: dict(stats) for name, stats in _payload_stats.items()}
+
+
+def reset_payload_stats():
+    with _lock:
+        _payload_stats.clear()
+
+
+def log_stats():
+    for name, stats in get_payload_stats().items():
+        average_kb = stats["bytes"] / max(1, stats["pages"]) / 1024
+        write_log(f"[PAYLOAD] {name}: {stats['pages']} pages, {stats['bytes'] / 1024 / 1024:.1f} MB sent (avg {average_kb:.0f} KB/page)")
@@ -0,0 +1,80 @@
+# parsers/json_stream.py
+
+import json
+
+# Incremental parser for the JSON array GPT answers with. Text is fed in as it streams in and
+# every top-level object is returned the moment its closing brace arrives, so offers reach the
+# DB while the model is still generating. Anything around the array (```json fences, a sentence
+# before it) is ignored, so fenced and unfenced answers parse the same way.
+class JsonArrayStream:
+    def __init__(self):
+        self.started = False     # saw the opening "["
+        self.closed = False      # saw the matching "]" — the answer was complete
+        self.items = 0
+        self.errors = 0          # objects that closed but weren't valid JSON
+        self._depth = 0          # nesting inside the array (1 = between items)
+        self._in_string = False
+        self._escape = False
+        self._buffer = []        # characters of the object being read
+
+    # Feed the next piece of text — returns the objects completed by it
+    def feed(self, text):
+        completed = []
+        for char in text:
+            if self.closed:
+                break
+            if not self.started:
+                if char == "[":
+                    self.started = True
+                    self._depth = 1
+                continue
+
+            if self._depth > 1:
+                self._buffer.append(char)
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == "\\":
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+                continue
+
+            if char == '"':
+                self._in_string = True
+            elif char in "{[":
+                if self._depth == 1:
+                    self._buffer = [char]
+                self._depth += 1
+            elif char in "}]":
+                self._depth -= 1
+                if self._depth == 1:
+                    item = self._decode("".join(self._buffer))
+                    self._buffer = []
+                    if item is not None:
+                        completed.append(item)
+                elif self._depth == 0:
+                    self.closed = True
+        return completed
+
+    def _decode(self, text):
+        try:
+            item = json.loads(text)
+        except ValueError:
+            self.errors += 1
+            return None
+        if not isinstance(item, dict):
+            self.errors += 1
+            return None
+        self.items += 1
+        return item
+
+
+# Whole response text → list of objects, or None if it holds no complete JSON array
+def parse_array(text):
+    stream = JsonArrayStream()
+    items = stream.feed(text)
+    if not stream.closed:
+        return None
+    return items
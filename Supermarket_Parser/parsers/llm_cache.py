@@ -0,0 +1,117 @@
+# parsers/llm_cache.py
+
+import os
+import json
+import hashlib
+import threading
+from log_writer import write_log
+
+# On-disk cache of GPT responses, keyed by rendered page + system prompt + model
+CACHE_DIR = "llm_cache"
+MAX_CACHE_BYTES = 500 * 1024 * 1024   # LRU-evict down to 90% of this when exceeded  # Adjust as needed
+ENABLED = True
+
+_lock = threading.Lock()
+_cache_bytes = None  # total size on disk, scanned on first write
+_stats = {"hits": 0, "misses": 0}
+
+
+# Helper — content address for one request. The prompt hash is also the folder name,
+# so editing one parser's prompt only orphans that chain's entries (LRU cleans them up).
+def make_key(image_bytes, system_prompt, model):
+    prompt_hash = hashlib.sha256(system_prompt.encode("utf-8")).hexdigest()
+    digest = hashlib.sha256()
+    digest.update(model.encode("utf-8") + b"\0")
+    digest.update(prompt_hash.encode("ascii") + b"\0")
+    digest.update(image_bytes)
+    return f"{prompt_hash[:16]}/{digest.hexdigest()}"
+
+
+def _entry_path(key):
+    return os.path.join(CACHE_DIR, *key.split("/")) + ".json"
+
+
+# Cached response text for this key, or None
+def get_response(key):
+    if not ENABLED:
+        return None
+    path = _entry_path(key)
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            entry = json.load(f)
+        os.utime(path)  # mark as recently used
+    except (OSError, ValueError):
+        with _lock:
+            _stats["misses"] += 1
+        return None
+
+    with _lock:
+        _stats["hits"] += 1
+    return entry["response_text"]
+
+
+# Store a response that parsed fine — failed responses are never cached
+def store_response(key, model, response_text):
+    global _cache_bytes
+    if not ENABLED:
+        return
+    path = _entry_path(key)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    data = json.dumps({"model": model, "response_text": response_text}, ensure_ascii=False).encode("utf-8")
+    tmp_path = f"{path}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+    with _lock:
+        if _cache_bytes is None:
+            _cache_bytes = _scan_size()
+        else:
+            _cache_bytes += len(data)
+        if _cache_bytes > MAX_CACHE_BYTES:
+            _evict()
+
+
+def _list_entries():
+    entries = []
+    for root, _, files in os.walk(CACHE_DIR):
+        for name in files:
+            if name.endswith(".json"):
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+    return entries
+
+
+def _scan_size():
+    return sum(size for _, size, _ in _list_entries())
+
+
+# Drop least recently used entries until the cache is back under 90% of the limit (called under _lock)
+def _evict():
+    global _cache_bytes
+    entries = sorted(_list_entries())
+    total = sum(size for _, size, _ in entries)
+    target = MAX_CACHE_BYTES * 0.9
+    for _, size, path in entries:
+        if total <= target:
+            break
+        try:
+            os.remove(path)
+            total -= size
+        except OSError:
+            pass
+    _cache_bytes = total
+
+
+def get_stats():
+    with _lock:
+        return dict(_stats)
+
+
+def log_stats():
+    stats = get_stats()
+    write_log(f"[CACHE] LLM responses: {stats['hits']} hits, {stats['misses']} misses")
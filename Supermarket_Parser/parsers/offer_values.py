@@ -0,0 +1,144 @@
+# parsers/offer_values.py
+
+import re
+from decimal import Decimal, InvalidOperation
+
+# Typed values of an offer, parsed once in normalize_offer and stored next to the text columns:
+#   OfferPriceMin / OfferPriceMax, OriginalPriceMin / OriginalPriceMax — decimal(10,2); a single
+#       price gives min = max, a range "1.99-2.39" gives both ends, "Not Clear" etc. gives NULL
+#   OfferKind — what kind of promotion the OfferType is (OFFER_KINDS)
+#   Quantity  — products the OfferPrice is for: "2 voor 5,-" → 2, "1+1 gratis" → 2, else 1
+# Values that don't fit the columns (a misread "12345678901") are NULL, so one bad value can't
+# fail the bulk write of a whole batch.
+# The text columns stay as the model wrote them (they are the dedup key), so price queries use
+# the typed columns and never parse strings.
+OFFER_KINDS = ("multibuy", "percent", "second_half", "op_op", "discount", "regular", "other")
+
+MAX_PRICE = Decimal("99999999.99")   # decimal(10,2)
+MAX_QUANTITY = 1000                  # fits the int column with room; more is a misread number
+
+_CENT = Decimal("0.01")
+_PRICE_PATTERN = re.compile(r"\d+(?:[.,]\d{1,2})?")
+# Counts are whole numbers on their own — (?<![\d.,]) keeps "2.99 voor" from reading as "99 voor";
+# "van 3 voor 1.99" is checked with _FROM_TO_PATTERN first, so its old price isn't a count either
+_FREE_PATTERN = re.compile(r"(?<![\d.,])(\d+)\s*\+\s*(\d+)(?![\d.,])")             # "1+1 gratis", "2+3 gratis"
+_FOR_PATTERN = re.compile(r"(?<![\d.,])(\d+)\s*(?:voor|for)\b", re.IGNORECASE)       # "2 voor 5,-", "KIES & MIX 3 VOOR 10"
+_SECOND_HALF_PATTERN = re.compile(r"(?<![\d.,])(\d+)\s*e\s*halve", re.IGNORECASE)    # "2e halve prijs"
+_FROM_TO_PATTERN = re.compile(r"\bvan\b.*\bvoor\b", re.IGNORECASE)                   # "van 2.99 voor 1.99"
+_PERCENT_PATTERN = re.compile(r"\d+\s*%")
+
+
+# Helper — "€ 1,99" / "1.99" / "6.-" → Decimal("1.99") / Decimal("6.00"), anything else (or more
+# than MAX_PRICE) → None
+def parse_price(value):
+    text = str(value or "").strip().lower().replace("€", "").replace(" ", "")
+    text = re.sub(r"[.,]-$", "", text)
+    if not _PRICE_PATTERN.fullmatch(text):
+        return None
+    try:
+        price = Decimal(text.replace(",", ".")).quantize(_CENT)
+    except InvalidOperation:
+        return None
+    return price if price <= MAX_PRICE else None
+
+
+# A single price or a range "1.99-2.39" → (min, max), else None
+def price_range(value):
+    parts = str(value or "").split("-")
+    if len(parts) == 2 and parts[1].strip():
+        low, high = parse_price(parts[0]), parse_price(parts[1])
+        if low is None or high is None:
+            return None
+        return (low, high) if low <= high else (high, low)
+    price = parse_price(value)
+    return (price, price) if price is not None else None
+
+
+# OfferType → one of OFFER_KINDS
+def offer_kind(offer_type):
+    text = str(offer_type or "").strip().lower()
+    if not text:
+        return "other"
+    if _FROM_TO_PATTERN.search(text):   # before the counts — "van 3 voor 1.99" is an old price, not 3 products
+        return "discount"
+    if _FREE_PATTERN.search(text) or _FOR_PATTERN.search(text) or "kies" in text:
+        return "multibuy"
+    if _SECOND_HALF_PATTERN.search(text) or "halve prijs" in text:
+        return "second_half"
+    if _PERCENT_PATTERN.search(text):
+        return "percent"
+    if text.replace(" ", "") in ("op=op", "op-op"):
+        return "op_op"
+    if "regular" in text:
+        return "regular"
+    if "discount" in text or "korting" in text or "actie" in text:
+        return "discount"
+    return "other"
+
+
+# OfferType → number of products the OfferPrice is for, None when it's more than MAX_QUANTITY
+def quantity(offer_type):
+    text = str(offer_type or "")
+    if _FROM_TO_PATTERN.search(text):   # "van X voor Y" — one product at the new price
+        return 1
+    match = _FREE_PATTERN.search(text)
+    if match:
+        count = int(match.group(1)) + int(match.group(2))
+    else:
+        match = _FOR_PATTERN.search(text) or _SECOND_HALF_PATTERN.search(text)
+        count = max(int(match.group(1)), 1) if match else 1
+    return count if count <= MAX_QUANTITY else None
+
+
+# Normalized offer → its typed columns (added to the offer dict by normalize_offer)
+def typed_values(offer_type, original_price, offer_price):
+    offer_min, offer_max = price_range(offer_price) or (None, None)
+    original_min, original_max = price_range(original_price) or (None, None)
+    return {
+        "OfferPriceMin": offer_min,
+        "OfferPriceMax": offer_max,
+        "OriginalPriceMin": original_min,
+        "OriginalPriceMax": original_max,
+        "OfferKind": offer_kind(offer_type),
+        "Quantity": quantity(offer_type),
+    }
+
+
+# Known OfferType / price texts and their typed values — `python -m parsers.offer_values` checks
+# them (run it after changing a pattern above)
+EXAMPLES = [
+    # (OfferType, OriginalPrice, OfferPrice) → (OfferKind, Quantity, OfferPriceMin, OfferPriceMax)
+    (("1+1 gratis", "3.00", "1.50"), ("multibuy", 2, "1.50", "1.50")),
+    (("2+3 gratis", "2.49", "1.00"), ("multibuy", 5, "1.00", "1.00")),
+    (("KIES & MIX 2 VOOR 5,-", "Not Clear", "5.-"), ("multibuy", 2, "5.00", "5.00")),
+    (("2e halve prijs", "4", "3"), ("second_half", 2, "3.00", "3.00")),
+    (("25%", "€ 2,49", "1,87"), ("percent", 1, "1.87", "1.87")),
+    (("van 2.99 voor 1.99", "2.99", "1.99"), ("discount", 1, "1.99", "1.99")),
+    (("van 2,99 voor 1,99", "2,99", "1,99"), ("discount", 1, "1.99", "1.99")),
+    (("Van 12.50 voor 9.99", "12.50", "9.99"), ("discount", 1, "9.99", "9.99")),
+    (("van 3 voor 1.99", "3", "1.99"), ("discount", 1, "1.99", "1.99")),
+    (("Van 10 voor 7,99", "10", "7,99"), ("discount", 1, "7.99", "7.99")),
+    (("van 3,- voor 2,-", "3,-", "2,-"), ("discount", 1, "2.00", "2.00")),
+    (("Discount Range", "Not Clear", "2.39-1.99"), ("discount", 1, "1.99", "2.39")),
+    (("OP=OP", "", ""), ("op_op", 1, None, None)),
+    (("Regular Price", "1.29", "1.29"), ("regular", 1, "1.29", "1.29")),
+    (("Discount", "12345678901", "123456789"), ("discount", 1, None, None)),
+    (("99999999999 voor 5", "", "5"), ("multibuy", None, "5.00", "5.00")),
+]
+
+
+def _check_examples():
+    failed = 0
+    for (offer_type, original_price, offer_price), expected in EXAMPLES:
+        values = typed_values(offer_type, original_price, offer_price)
+        low, high = values["OfferPriceMin"], values["OfferPriceMax"]
+        got = (values["OfferKind"], values["Quantity"], None if low is None else str(low), None if high is None else str(high))
+        if got != expected:
+            failed += 1
+            print(f"❌ {offer_type!r} / {original_price!r} / {offer_price!r}: {got}, expected {expected}")
+    print(f"{len(EXAMPLES) - failed} of {len(EXAMPLES)} examples OK")
+    return failed
+
+
+if __name__ == "__main__":
+    raise SystemExit(1 if _check_examples() else 0)
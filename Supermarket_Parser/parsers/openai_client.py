@@ -0,0 +1,62 @@
+# parsers/openai_client.py
+
+import threading
+import httpx
+from openai import OpenAI
+from parsers import dispatch
+
+# Hardcoded API key — replace with your key:
+OPENAI_API_KEY = " ... YOUR_OPENAI_API_KEY ... " # Adjust as needed
+
+# Keep-alive pool for the one client every chain shares. The pool is sized from the dispatch
+# limit so a page request never waits for a connection, and idle connections are kept long
+# enough to survive the gap between two pages of the same flyer.
+KEEPALIVE_EXPIRY = 120       # seconds
+CONNECT_TIMEOUT = 10
+READ_TIMEOUT = 180           # a dense page can take minutes to generate
+MAX_RETRIES = 0              # retries are parsers/retry_policy.py's job (backoff, Retry-After, circuit breaker)
+
+# USD per 1M tokens (input, cached input, output) — for the cost per chain in the run metrics  # Adjust as needed
+MODEL_PRICES = {
+    "gpt-4o": (2.50, 1.25, 10.00),
+    "gpt-4o-mini": (0.15, 0.075, 0.60),
+}
+BATCH_DISCOUNT = 0.5         # Batch API calls cost half
+
+_client = None
+_client_lock = threading.Lock()
+
+
+# The shared OpenAI client — built on first use, reused by all chains for the whole run
+def get_client():
+    global _client
+    with _client_lock:
+        if _client is None:
+            pool_size = max(dispatch.MAX_IN_FLIGHT, 4)
+            http_client = httpx.Client(
+                limits=httpx.Limits(
+                    max_connections=pool_size * 2,
+                    max_keepalive_connections=pool_size,
+                    keepalive_expiry=KEEPALIVE_EXPIRY,
+                ),
+                timeout=httpx.Timeout(READ_TIMEOUT, connect=CONNECT_TIMEOUT),
+            )
+            _client = OpenAI(api_key=OPENAI_API_KEY, http_client=http_client, max_retries=MAX_RETRIES)
+        return _client
+
+
+# Swap in another client (e.g. one pointed at a local endpoint) — used by tools and benchmarks
+def set_client(client):
+    global _client
+    with _client_lock:
+        _client = client
+
+
+# Cost in USD of one call from its token counts — None for a model without prices
+def usage_cost(model, prompt_tokens, cached_tokens, completion_tokens, batch=False):
+    prices = MODEL_PRICES.get(model)
+    if prices is None:
+        return None
+    input_price, cached_price, output_price = prices
+    cost = ((prompt_tokens - cached_tokens) * input_price + cached_tokens * cached_price + completion_tokens * output_price) / 1_000_000
+    return cost * BATCH_DISCOUNT if batch else cost
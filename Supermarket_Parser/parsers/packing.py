@@ -0,0 +1,62 @@
+# parsers/packing.py
+
+# Multi-page packing. Sparse pages (ALDI pages often hold 1-5 offers) cost a whole request each —
+# system prompt, connection, time to first token — for a few lines of answer. With PACK_PAGES > 1
+# a chain's consecutive pages are grouped into packs that are asked for in one request, one image
+# per page, and the answer's "Page" field splits the offers back per page.
+# Only pages that go as a plain image are packed: text-layer, reused and dense pages (see below)
+# are sent on their own. A pack that fails, is cut off at max_tokens, or has offers without a
+# valid "Page" falls back to single pages. Its offers are held until the pack is accepted, so a
+# mis-tagged offer of a rejected pack never reaches the DB under the wrong PageNumber. A page of
+# an accepted pack that got no offers is asked for on its own as well — the model may have skipped
+# it, and a page finished with 0 offers would count as done.
+MAX_PACK_PAGES = 4           # upper bound for a chain's PACK_PAGES
+PACK_MAX_PRICES = 12         # prices in the text layer from which a page counts as too dense to pack
+
+# Told to the model after the images of a pack
+PACK_NOTE = (
+    "These are {count} pages of one flyer ({pages}); each image comes right after its page number. "
+    "List the offers of all pages in one JSON array, in the same format, and add to every item "
+    "\"Page\": the number of the page the offer is on."
+)
+
+
+# Selected pages → units of up to pack_pages consecutive pages, [[(page_number, page), ...], ...]
+def group_pages(selected_pages, pack_pages):
+    size = max(1, min(pack_pages, MAX_PACK_PAGES))
+    return [selected_pages[start:start + size] for start in range(0, len(selected_pages), size)]
+
+
+# Helper — the page an item is tagged with, or None
+def item_page(item):
+    try:
+        return int(str(item.get("Page")).strip())
+    except (TypeError, ValueError):
+        return None
+
+
+# Sink of one packed request — sorts every item by its "Page" and holds it until deliver().
+# Items without a page of this pack are counted, not guessed.
+class PackOffers:
+    def __init__(self, sinks):
+        self.sinks = sinks                        # page number → PageOffers
+        self.page_number = next(iter(sinks))     # for log lines
+        self.items = {page_number: [] for page_number in sinks}
+        self.untagged = 0
+
+    def count_attempt(self):
+        for sink in self.sinks.values():
+            sink.count_attempt()
+
+    def add_all(self, items):
+        for item in items:
+            page_items = self.items.get(item_page(item))
+            if page_items is None:
+                self.untagged += 1
+                continue
+            page_items.append(item)
+
+    # The pack was accepted — these pages' items go to their PageOffers (and on to the DB writer)
+    def deliver(self, page_numbers):
+        for page_number in page_numbers:
+            self.sinks[page_number].add_all(self.items[page_number])
@@ -0,0 +1,185 @@
+# parsers/page_index.py
+
+import io
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from PIL import Image
+from log_writer import write_log
+
+# Perceptual index of parsed pages. Chains reuse whole pages week after week ("Elke dag laag",
+# fixed category pages), so every rendered page is fingerprinted and looked up here first: when it
+# looks the same as a page parsed before (same chain, prompt and model), that page's offers are
+# reused under the new week and page number and no API call is made.
+#   hash   — 64-bit dHash of the page (9x8 gradient), the lookup key
+#   detail — 4096-bit dHash (65x64) + text-layer hash, checked before a match counts, so a page
+#            with the same layout but other products or prices is not taken for the old one
+# Lookups stay fast over hundreds of weeks with multi-index hashing: the 64-bit hash is split into
+# 4 bands of 16 bits, each with its own index. Two hashes within MAX_DISTANCE (< 4) bits of each
+# other agree exactly on at least one band, so one index lookup per band finds every candidate.
+INDEX_PATH = "page_index.sqlite"
+
+MAX_DISTANCE = 3             # bits of the 64-bit hash that may differ (must stay below BANDS)
+MAX_DETAIL_DISTANCE = 8      # bits of the 4096-bit detail hash that may differ — one changed price label is ~30
+BANDS = 4
+BAND_BITS = 16
+DETAIL_SIZE = (65, 64)
+
+_conn = None
+_lock = threading.Lock()
+_stats = {"lookups": 0, "reused": 0, "indexed": 0}
+
+
+def open_index(path=None):
+    global _conn
+    with _lock:
+        if _conn is not None:
+            return
+        _conn = sqlite3.connect(path or INDEX_PATH, check_same_thread=False, timeout=30)
+        _conn.execute("PRAGMA journal_mode=WAL")
+        _conn.execute("""
+            CREATE TABLE IF NOT EXISTS pages (
+                id INTEGER PRIMARY KEY,
+                scope TEXT NOT NULL,
+                chain TEXT NOT NULL,
+                week INTEGER NOT NULL,
+                pdf_name TEXT NOT NULL,
+                page INTEGER NOT NULL,
+                band0 INTEGER NOT NULL,
+                band1 INTEGER NOT NULL,
+                band2 INTEGER NOT NULL,
+                band3 INTEGER NOT NULL,
+                detail BLOB NOT NULL,
+                text_hash TEXT NOT NULL,
+                offers TEXT NOT NULL,
+                created_at REAL NOT NULL
+            )
+        """)
+        for band in range(BANDS):
+            _conn.execute(f"CREATE INDEX IF NOT EXISTS ix_pages_band{band} ON pages (scope, band{band})")
+        _conn.commit()
+
+
+def close_index():
+    global _conn
+    with _lock:
+        if _conn is not None:
+            _conn.close()
+            _conn = None
+
+
+def is_open():
+    return _conn is not None
+
+
+# Helper — 64-bit hash → its 4 band values
+def split_bands(page_hash):
+    mask = (1 << BAND_BITS) - 1
+    return [(page_hash >> (band * BAND_BITS)) & mask for band in range(BANDS)]
+
+
+def join_bands(bands):
+    return sum(value << (band * BAND_BITS) for band, value in enumerate(bands))
+
+
+# Helper — difference hash: one bit per pixel, set where it's brighter than its right neighbour
+def _dhash(gray, size):
+    width, height = size
+    pixels = list(gray.resize(size, Image.BILINEAR).getdata())
+    value = 0
+    for row in range(height):
+        for col in range(width - 1):
+            left = pixels[row * width + col]
+            value = (value << 1) | (left > pixels[row * width + col + 1])
+    return value
+
+
+def _distance(a, b):
+    return bin(a ^ b).count("1")
+
+
+# Fingerprint of one rendered page → (hash, detail, text_hash). page (pdfplumber) adds the text
+# layer to the fingerprint; image-only pages hash to the same empty text.
+def fingerprint(image_buffer, page=None):
+    with Image.open(io.BytesIO(image_buffer)) as image:
+        gray = image.convert("L")
+    gray = gray.resize((DETAIL_SIZE[0] * 4, DETAIL_SIZE[1] * 4), Image.BILINEAR, reducing_gap=3.0)
+    page_hash = _dhash(gray, (9, 8))
+    detail = _dhash(gray, DETAIL_SIZE).to_bytes((DETAIL_SIZE[0] - 1) * DETAIL_SIZE[1] // 8, "big")
+
+    text = ""
+    if page is not None:
+        try:
+            text = " ".join((page.extract_text() or "").split())
+        except Exception:
+            text = ""
+    return page_hash, detail, hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+# The closest indexed page within the thresholds, or None →
+# {"chain", "week", "pdf_name", "page", "distance", "offers"}
+def find(scope, page_fingerprint):
+    page_hash, detail, text_hash = page_fingerprint
+    bands = split_bands(page_hash)
+    with _lock:
+        if _conn is None:
+            return None
+        # One indexed lookup per band (an OR over the bands would scan the whole scope)
+        candidates = " UNION ".join(f"SELECT id FROM pages WHERE scope = ? AND band{band} = ?" for band in range(BANDS))
+        rows = _conn.execute(f"""
+            SELECT chain, week, pdf_name, page, band0, band1, band2, band3, detail, text_hash, offers
+            FROM pages
+            WHERE id IN ({candidates})
+            ORDER BY id DESC
+        """, [value for band in bands for value in (scope, band)]).fetchall()
+        _stats["lookups"] += 1
+
+    best = None
+    for chain, week, pdf_name, page, band0, band1, band2, band3, row_detail, row_text_hash, offers in rows:
+        distance = _distance(page_hash, join_bands((band0, band1, band2, band3)))
+        if distance > MAX_DISTANCE or row_text_hash != text_hash:
+            continue
+        if _distance(int.from_bytes(detail, "big"), int.from_bytes(row_detail, "big")) > MAX_DETAIL_DISTANCE:
+            continue
+        if best is None or distance < best["distance"]:
+            best = {"chain": chain, "week": week, "pdf_name": pdf_name, "page": page, "distance": distance, "offers": offers}
+
+    if best is None:
+        return None
+    best["offers"] = json.loads(best["offers"])
+    with _lock:
+        _stats["reused"] += 1
+    return best
+
+
+# Store a parsed page with its offers (only the fields GPT delivered — week, page and file are
+# filled in again when the page is reused)
+def add_page(scope, chain, week_number, pdf_name, page_number, page_fingerprint, offers):
+    page_hash, detail, text_hash = page_fingerprint
+    items = [
+        {field: offer[field] for field in ("ProductName", "OfferType", "OriginalPrice", "OfferPrice")}
+        for offer in offers
+    ]
+    with _lock:
+        if _conn is None:
+            return
+        _conn.execute("""
+            INSERT INTO pages (scope, chain, week, pdf_name, page, band0, band1, band2, band3, detail, text_hash, offers, created_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, [scope, chain, week_number, pdf_name, page_number] + split_bands(page_hash)
+              + [detail, text_hash, json.dumps(items, ensure_ascii=False), time.time()])
+        _conn.commit()
+        _stats["indexed"] += 1
+
+
+def get_stats():
+    with _lock:
+        return dict(_stats)
+
+
+def log_stats():
+    stats = get_stats()
+    if stats["lookups"]:
+        write_log(f"[REUSE] Pages reused from earlier flyers: {stats['reused']} of {stats['lookups']} looked up ({stats['indexed']} newly indexed)")
@@ -0,0 +1,23 @@
+# parsers/prompts.py
+
+import os
+import threading
+
+# System prompts are versioned files in parser_versioning/ (<chain>_v<N>.txt), read once per
+# process. Changing a prompt = a new file + a PROMPT_VERSION bump in the chain parser, so the run
+# metrics (prompt_version, tokens, cost), the LLM cache and the page index keep versions apart.
+# The prompt is the first message of every request and the same for every page, so the API can
+# serve it from its prompt cache (cached_tokens in the run metrics); requests send the version as
+# prompt_cache_key, which keeps one version's requests on the same cache.
+PROMPT_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "parser_versioning")
+
+_prompts = {}
+_lock = threading.Lock()
+
+
+def load_prompt(version):
+    with _lock:
+        if version not in _prompts:
+            with open(os.path.join(PROMPT_DIR, f"{version}.txt"), "r", encoding="utf-8") as f:
+                _prompts[version] = f.read().strip()
+        return _prompts[version]
@@ -0,0 +1,40 @@
+# parsers/registry.py
+
+import importlib
+import threading
+
+# Chain → parser module. Modules are only imported when a flyer for that chain shows up,
+# so pdfplumber / openai / dateutil stay unloaded until there's real work.
+CHAIN_MODULES = {
+    "AH": "parsers.ah_parser",
+    "ALDI": "parsers.aldi_parser",
+    "JUMBO": "parsers.jumbo_parser",
+    "LIDL": "parsers.lidl_parser",
+    "PLUS": "parsers.plus_parser"
+}
+
+_loaded = {}
+_lock = threading.Lock()
+
+
+# Helper — chain for a PDF file name (e.g. "AH_W26.pdf" → "AH"), or None
+def detect_chain(filename):
+    return next((key for key in CHAIN_MODULES if key in filename.upper()), None)
+
+
+# The chain's parser module, imported on first use
+def _load(chain):
+    with _lock:
+        if chain not in _loaded:
+            _loaded[chain] = importlib.import_module(CHAIN_MODULES[chain])
+        return _loaded[chain]
+
+
+# parse_pdf of the chain's parser
+def get_parse_func(chain):
+    return _load(chain).parse_pdf
+
+
+# The chain's BaseFlyerParser (prompt, model, image profile) — for callers that drive the steps themselves
+def get_parser(chain):
+    return _load(chain)._parser
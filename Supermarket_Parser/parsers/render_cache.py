@@ -0,0 +1,111 @@
+# parsers/render_cache.py
+
+import os
+import mmap
+import shutil
+import hashlib
+import threading
+from PIL import Image
+from log_writer import write_log
+
+# On-disk cache of rendered pages, shared by main.py and retry_failed_pages.py
+CACHE_DIR = "render_cache"
+MAX_CACHE_BYTES = 20 * 1024 * 1024 * 1024   # whole flyers are dropped oldest-first above this  # Adjust as needed
+ENABLED = True
+
+_lock = threading.Lock()
+_pdf_hashes = {}  # (filepath, size, mtime) → sha256
+_stats = {"hits": 0, "misses": 0}
+
+
+# Helper — SHA-256 of the PDF file, computed once per file version
+def pdf_sha256(filepath):
+    stat = os.stat(filepath)
+    file_key = (os.path.abspath(filepath), stat.st_size, stat.st_mtime_ns)
+    with _lock:
+        if file_key in _pdf_hashes:
+            return _pdf_hashes[file_key]
+
+    digest = hashlib.sha256()
+    with open(filepath, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+
+    with _lock:
+        _pdf_hashes[file_key] = digest.hexdigest()
+        return _pdf_hashes[file_key]
+
+
+# Cache file for one rendered page: render_cache/<pdf sha256>/p<page>_<dpi>dpi.<encoding>
+def entry_path(pdf_hash, page_number, resolution, encoding):
+    return os.path.join(CACHE_DIR, pdf_hash, f"p{page_number}_{resolution}dpi.{encoding}")
+
+
+# Write an encoded page atomically — also called from render worker processes
+def store(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+# Memory-map a cached page — returns (buffer, (width, height)) or None when it isn't cached.
+# The buffer is read-only and is only paged in as it's hashed/encoded.
+def load(path, count=True):
+    try:
+        with open(path, "rb") as f:
+            buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError):
+        if count:
+            with _lock:
+                _stats["misses"] += 1
+        return None
+
+    with Image.open(buffer) as image:  # reads the header only
+        image_size = image.size
+    buffer.seek(0)
+
+    if count:
+        with _lock:
+            _stats["hits"] += 1
+    return buffer, image_size
+
+
+def _folder_size(folder):
+    total = 0
+    for root, _, files in os.walk(folder):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+
+# Drop whole flyers, least recently rendered first, until the cache fits MAX_CACHE_BYTES
+def evict():
+    if not os.path.isdir(CACHE_DIR):
+        return
+    folders = []
+    for name in os.listdir(CACHE_DIR):
+        folder = os.path.join(CACHE_DIR, name)
+        if os.path.isdir(folder):
+            folders.append((os.path.getmtime(folder), _folder_size(folder), folder))
+
+    total = sum(size for _, size, _ in folders)
+    for _, size, folder in sorted(folders):
+        if total <= MAX_CACHE_BYTES:
+            break
+        shutil.rmtree(folder, ignore_errors=True)
+        total -= size
+
+
+def get_stats():
+    with _lock:
+        return dict(_stats)
+
+
+def log_stats():
+    stats = get_stats()
+    write_log(f"[CACHE] Rendered pages: {stats['hits']} hits, {stats['misses']} misses")
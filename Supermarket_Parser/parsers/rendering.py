@@ -0,0 +1,64 @@
+# parsers/rendering.py
+
+import pdfplumber
+from parsers import render_cache
+from parsers.image_profiles import encode_image, profile_encoding
+
+# Process pool for rasterizing pages — set by main.py when flyers run in parallel, None = render inline
+_render_pool = None
+
+# PDFs already opened inside a render worker process (filepath → pdfplumber PDF)
+_worker_pdfs = {}
+MAX_WORKER_PDFS = 8
+
+
+def set_render_pool(pool):
+    global _render_pool
+    _render_pool = pool
+
+
+# Helper — rasterize a pdfplumber page and encode it with the image profile
+def page_to_image_bytes(page, profile):
+    image = page.to_image(resolution=profile["dpi"]).original
+    return encode_image(image, profile)
+
+
+# Runs inside a render worker process — keeps a few PDFs open so a flyer isn't re-parsed per page.
+# The image goes straight into the render cache; only the path travels back to the parent.
+def _render_in_worker(filepath, page_number, profile, cache_path):
+    pdf = _worker_pdfs.get(filepath)
+    if pdf is None:
+        if len(_worker_pdfs) >= MAX_WORKER_PDFS:
+            _worker_pdfs.pop(next(iter(_worker_pdfs))).close()
+        pdf = pdfplumber.open(filepath)
+        _worker_pdfs[filepath] = pdf
+    image_bytes, image_size = page_to_image_bytes(pdf.pages[page_number - 1], profile)
+    if cache_path is None:
+        return image_bytes, image_size
+    render_cache.store(cache_path, image_bytes)
+    return cache_path
+
+
+# Render one page with the image profile — served from the render cache when this
+# PDF/page/DPI/encoding was rendered before, otherwise rasterized on the shared process pool
+# (or in this thread) and cached. Returns (image_buffer, (width, height)); the buffer is bytes
+# or a read-only mmap.
+def render_page_image(filepath, page_number, page, profile):
+    if not render_cache.ENABLED:
+        if _render_pool is None:
+            return page_to_image_bytes(page, profile)
+        return _render_pool.submit(_render_in_worker, filepath, page_number, profile, None).result()
+
+    cache_path = render_cache.entry_path(
+        render_cache.pdf_sha256(filepath), page_number, profile["dpi"], profile_encoding(profile)
+    )
+    cached = render_cache.load(cache_path)
+    if cached is not None:
+        return cached
+
+    if _render_pool is None:
+        image_bytes, _ = page_to_image_bytes(page, profile)
+        render_cache.store(cache_path, image_bytes)
+    else:
+        _render_pool.submit(_render_in_worker, filepath, page_number, profile, cache_path).result()
+    return render_cache.load(cache_path, count=False)
@@ -0,0 +1,150 @@
+# parsers/retry_policy.py
+
+import time
+import random
+import threading
+import httpx
+import openai
+from log_writer import write_log
+
+# One retry policy for every chain. Failed calls back off exponentially with jitter (or as long
+# as the API's Retry-After says), a page waiting for its retry goes to the back of the dispatch
+# queue instead of sleeping on its slot, and a circuit breaker pauses all requests while the
+# endpoint keeps failing — a burst of "Connection error." costs a few calls, not three per page.
+BASE_DELAY = 2               # seconds before the first retry (before jitter)
+MAX_DELAY = 60               # cap for one backoff
+MAX_RETRY_AFTER = 300        # don't trust a Retry-After longer than this
+
+BREAKER_THRESHOLD = 5        # endpoint failures in a row that open the breaker
+BREAKER_COOLDOWN = 15        # seconds the breaker stays open the first time (doubles while it keeps failing)
+BREAKER_MAX_COOLDOWN = 120
+
+# Errors no retry will fix — the page fails right away
+FATAL_ERRORS = (
+    openai.BadRequestError,
+    openai.AuthenticationError,
+    openai.PermissionDeniedError,
+    openai.NotFoundError,
+    openai.UnprocessableEntityError,
+)
+
+# Errors that say the endpoint itself is in trouble — these count towards the breaker
+# (a reply that wasn't valid JSON is the model's fault, not the endpoint's)
+ENDPOINT_ERRORS = (
+    openai.APIConnectionError,      # incl. APITimeoutError
+    httpx.TransportError,           # stream broke off mid-answer
+    openai.RateLimitError,
+    openai.InternalServerError,     # 5xx
+)
+
+
+# Raised by a page request that should be retried later — dispatch_pages gives the page's slot
+# back and puts it at the end of the queue after `delay` seconds. attempt = the next attempt.
+class RequeuePage(Exception):
+    def __init__(self, delay, attempt):
+        super().__init__(f"retry in {delay:.1f}s")
+        self.delay = delay
+        self.attempt = attempt
+
+
+def is_retryable(error):
+    return not isinstance(error, FATAL_ERRORS)
+
+
+# Helper — seconds the API asked us to wait (retry-after-ms / retry-after headers on 429 / 5xx), or None
+def retry_after(error):
+    response = getattr(error, "response", None)
+    if response is None:
+        return None
+    headers = response.headers
+    try:
+        if headers.get("retry-after-ms"):
+            return min(float(headers["retry-after-ms"]) / 1000, MAX_RETRY_AFTER)
+        if headers.get("retry-after"):
+            return min(float(headers["retry-after"]), MAX_RETRY_AFTER)
+    except ValueError:
+        pass  # HTTP-date form — fall back to our own backoff
+    return None
+
+
+# Delay before retry number `attempt` (1 = first retry): Retry-After if the API sent one, else
+# exponential backoff with jitter (between half and the full step, so retries spread out)
+def backoff_delay(attempt, error=None):
+    asked = retry_after(error) if error is not None else None
+    if asked is not None:
+        return asked
+    step = min(MAX_DELAY, BASE_DELAY * 2 ** (attempt - 1))
+    return random.uniform(step / 2, step)
+
+
+# Shared by every request in the process. Closed: requests go through. After BREAKER_THRESHOLD
+# endpoint failures in a row it opens and every request waits until the cooldown is over. Then one
+# request goes through as a probe while the rest keep waiting: success closes the breaker, failure
+# opens it again with a longer cooldown.
+class CircuitBreaker:
+    def __init__(self, threshold=BREAKER_THRESHOLD, cooldown=BREAKER_COOLDOWN, max_cooldown=BREAKER_MAX_COOLDOWN):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.times_opened = 0
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._open_until = 0.0
+        self._next_cooldown = cooldown
+        self._probing = False
+
+    # Block while the breaker is open — call right before every request
+    def wait(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                if now >= self._open_until:
+                    if self._failures < self.threshold:
+                        return
+                    if not self._probing:
+                        self._probing = True   # this request is the probe
+                        return
+                wait = max(self._open_until - now, 0.1)
+            time.sleep(wait)
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._probing = False
+            self._open_until = 0.0   # a request that was already in flight got through — close right away
+            self._next_cooldown = self.cooldown
+
+    def record_failure(self, error):
+        with self._lock:
+            self._failures += 1
+            self._probing = False
+            now = time.monotonic()
+            if self._failures < self.threshold or self._open_until > now:
+                return
+            cooldown = max(self._next_cooldown, retry_after(error) or 0)
+            self._open_until = now + cooldown
+            self._next_cooldown = min(self.max_cooldown, self._next_cooldown * 2)
+            self.times_opened += 1
+            failures = self._failures
+        write_log(f"[BREAKER] {failures} endpoint failures in a row ({type(error).__name__}) — pausing all requests for {cooldown:.0f}s")
+
+
+_breaker = None
+_breaker_lock = threading.Lock()
+
+
+def get_breaker():
+    global _breaker
+    with _breaker_lock:
+        if _breaker is None:
+            _breaker = CircuitBreaker()
+        return _breaker
+
+
+# Record the outcome of one API call — error None = success. Any other error means the endpoint
+# did answer (e.g. 400, or a reply that wasn't valid JSON), which counts as up for the breaker.
+def record_result(error=None):
+    if isinstance(error, ENDPOINT_ERRORS):
+        get_breaker().record_failure(error)
+    else:
+        get_breaker().record_success()
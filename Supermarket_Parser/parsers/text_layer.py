@@ -0,0 +1,83 @@
+# parsers/text_layer.py
+
+import re
+from parsers.tiling import PRICE_PATTERN
+
+# Text-layer fast path. Many flyers are exported with a real text layer, so product names and
+# prices can be sent as compact text + positions instead of a 300-DPI image — no rasterizing, a
+# fraction of the upload and (optionally) a cheaper text model. A page only takes this path when
+# its text layer looks complete; scanned pages, outlined fonts ("(cid:12)" glyphs) and pages with
+# only a few prices go as an image, as before.
+MIN_WORDS = 40               # fewer words → the products are probably in images
+MIN_PRICES = 4               # prices in the text layer
+MIN_READABLE_SHARE = 0.9     # share of characters that are real text (not (cid:..) glyph codes or control chars)
+LINE_TOLERANCE = 3           # points — words whose tops are this close are on one line
+WORD_GAP = 20                # points — a wider gap splits a line into blocks (flyers have columns)
+
+# Told to the model instead of sending the image
+TEXT_NOTE = (
+    "There is no image: below is the text layer of one flyer page. Each line is one block of text "
+    "as 'x,y: words', with x,y the position of the block in % of the page width and height. "
+    "Products, badges and prices that are close together belong together. "
+    "Use the same JSON format."
+)
+
+_CID_PATTERN = re.compile(r"\(cid:\d+\)")
+
+
+# Helper — share of a page's characters that are readable text
+def readable_share(chars):
+    if not chars:
+        return 0.0
+    readable = sum(1 for char in chars if char["text"].isprintable() and not _CID_PATTERN.fullmatch(char["text"]))
+    return readable / len(chars)
+
+
+# Helper — words → blocks: words on one line, split where the gap to the next word is wide
+def group_blocks(words, line_tolerance=LINE_TOLERANCE, word_gap=WORD_GAP):
+    lines = []
+    for word in sorted(words, key=lambda w: (round(w["top"]), w["x0"])):
+        if lines and abs(word["top"] - lines[-1][0]["top"]) <= line_tolerance:
+            lines[-1].append(word)
+        else:
+            lines.append([word])
+
+    blocks = []
+    for line in lines:
+        line.sort(key=lambda w: w["x0"])
+        block = [line[0]]
+        for word in line[1:]:
+            if word["x0"] - block[-1]["x1"] > word_gap:
+                blocks.append(block)
+                block = []
+            block.append(word)
+        blocks.append(block)
+    return blocks
+
+
+# The page's text layer as a compact "x,y: words" payload, or (None, reason) when the page has to
+# go as an image. Returns (payload, stats) with stats = {"words": n, "prices": n}.
+def extract_layout(page):
+    try:
+        words = page.extract_words(keep_blank_chars=False, use_text_flow=False)
+        chars = page.chars
+    except Exception as e:
+        return None, f"text layer unreadable: {e}"
+
+    if len(words) < MIN_WORDS:
+        return None, f"{len(words)} words"
+    share = readable_share(chars)
+    if share < MIN_READABLE_SHARE:
+        return None, f"only {share:.0%} readable characters"
+    text = " ".join(word["text"] for word in words)
+    prices = len(PRICE_PATTERN.findall(text))
+    if prices < MIN_PRICES:
+        return None, f"{prices} prices"
+
+    width, height = float(page.width), float(page.height)
+    lines = []
+    for block in group_blocks(words):
+        x = round(100 * block[0]["x0"] / width)
+        y = round(100 * block[0]["top"] / height)
+        lines.append(f"{x},{y}: " + " ".join(word["text"] for word in block))
+    return "\n".join(lines), {"words": len(words), "prices": prices}
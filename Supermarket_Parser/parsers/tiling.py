@@ -0,0 +1,75 @@
+# parsers/tiling.py
+
+import io
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from PIL import Image
+from parsers.image_profiles import encode_image
+
+# Dense pages (JUMBO / AH with 20+ products) make one huge generation that is slow, can run into
+# max_tokens and drops products. Such pages are cut into overlapping tiles that are asked for in
+# parallel, so the page takes as long as its slowest tile.
+TILE_GRID = (2, 2)          # rows, columns
+TILE_OVERLAP = 0.08         # share of the page height/width each tile reaches into its neighbour
+DENSE_PAGE_PRICES = 20      # prices in the text layer from which a page counts as dense
+TILE_WORKERS = 8            # tile requests in flight at once (on top of the page dispatch pool)
+
+# Told to the model with every tile, so it doesn't expect a whole page
+TILE_NOTE = (
+    "This image is tile {index} of {count} of one flyer page. The tiles overlap slightly. "
+    "List only the offers visible in this tile, using the same JSON format."
+)
+
+PRICE_PATTERN = re.compile(r"\d+[.,]\d{2}\b")
+
+_tile_pool = None
+_tile_pool_lock = threading.Lock()
+
+
+# Tile requests get their own pool — a page request waiting on its tiles must not hold up the
+# dispatch pool the tiles would otherwise queue behind
+def get_tile_pool():
+    global _tile_pool
+    with _tile_pool_lock:
+        if _tile_pool is None:
+            _tile_pool = ThreadPoolExecutor(max_workers=TILE_WORKERS, thread_name_prefix="tile")
+        return _tile_pool
+
+
+# Density heuristic — prices in the page's text layer (image-only pages count 0 and are only
+# tiled when the whole-page answer gets cut off at max_tokens)
+def count_prices(page):
+    try:
+        text = page.extract_text() or ""
+    except Exception:
+        return 0
+    return len(PRICE_PATTERN.findall(text))
+
+
+# Cut a rendered page into overlapping tiles, each encoded with the page's image profile.
+# Returns [(tile_bytes, (width, height)), ...] in reading order.
+def split_page(image_buffer, profile, grid=TILE_GRID, overlap=TILE_OVERLAP):
+    rows, cols = grid
+    image = Image.open(io.BytesIO(image_buffer))
+    image.load()
+    width, height = image.size
+    pad_x, pad_y = round(width * overlap), round(height * overlap)
+
+    tiles = []
+    for row in range(rows):
+        for col in range(cols):
+            left = max(0, col * width // cols - pad_x)
+            right = min(width, (col + 1) * width // cols + pad_x)
+            top = max(0, row * height // rows - pad_y)
+            bottom = min(height, (row + 1) * height // rows + pad_y)
+            tiles.append(encode_image(image.crop((left, top, right, bottom)), profile))
+    return tiles
+
+
+# Helper — merge key of one offer: product name + offer price, spacing/case/decimal comma ignored.
+# Products in the overlap of two tiles show up twice and are kept once.
+def offer_key(offer):
+    name = " ".join(str(offer.get("ProductName") or "").lower().split())
+    price = str(offer.get("OfferPrice") or "").strip().replace(",", ".")
+    return name, price
@@ -1,124 +1,52 @@
 # retry_failed_pages.py
 
 import argparse
-import re
-import pyodbc
-import os
-from parsers.ah_parser import parse_pdf as ah_parse
-from parsers.aldi_parser import parse_pdf as aldi_parse
-from parsers.jumbo_parser import parse_pdf as jumbo_parse
-from parsers.lidl_parser import parse_pdf as lidl_parse
-from parsers.plus_parser import parse_pdf as plus_parse
-from log_writer import write_log, init_log
+from log_writer import write_log, init_log, close_log
 
-# Init log correctly
-init_log("retry_failed_pages")
-
-# Parse arguments
+# Parse arguments — before the heavy imports, so --help is instant
 parser = argparse.ArgumentParser(description="Retry failed pages")
-parser.add_argument("--logfile", required=True, help="Path to log file")
 parser.add_argument("--week", required=True, type=int, help="Week number")
+parser.add_argument("--journal", default=None, help="Run journal file (default: run_journal.sqlite)")
+parser.add_argument("--log_json", action="store_true", help="Also write a JSON-lines log next to the text log")
 args = parser.parse_args()
 
-# DB connection
-conn = pyodbc.connect("DRIVER={ODBC Driver 17 for SQL Server};SERVER=localhost;DATABASE=AI_Supermarket;Trusted_Connection=yes;")
-cursor = conn.cursor()
+# Init log correctly — after argparse, so --help / bad arguments don't leave an empty log behind
+init_log("retry_failed_pages", json_lines=args.log_json)
+
+from parsers.llm_cache import log_stats as log_cache_stats
+from parsers import render_cache
+from parsers import image_profiles
+import run_journal
+from main import ensure_schema, process_flyer
 
-# Read failed pages from log
-def extract_failed_pages(logfile):
-    failed_pages = {}
-    with open(logfile, 'r', encoding='utf-8') as f:
-        for line in f:
-            match_skip = re.search(r'\[SKIP_PAGE\] (\d+) (.+\.pdf)', line)
-            if match_skip:
-                page_num = int(match_skip.group(1))
-                pdf_name = match_skip.group(2)
-                if pdf_name not in failed_pages:
-                    failed_pages[pdf_name] = []
-                failed_pages[pdf_name].append(page_num)
-    return failed_pages
+# Hash-keyed dedup column + unique index (no-op once the table has them)
+ensure_schema()
 
-failed_pages = extract_failed_pages(args.logfile)
+# Failed pages come from the run journal — every page of the week that isn't done (failed, or cut
+# short by a crash), with the PDF's original path. Finished pages are not touched again.
+run_journal.open_journal(args.journal)
+failed_pages = run_journal.unfinished_pages(args.week)
 
 if failed_pages:
     write_log(f"\n✅ Found failed pages to retry:")
-    for pdf_name, pages in failed_pages.items():
-        write_log(f"→ {pdf_name}: pages {pages}")
-
-    # Map PDF name → parser function → supermarket name
-    parser_map = {
-        "AH": (ah_parse, "AH"),
-        "ALDI": (aldi_parse, "ALDI"),
-        "JUMBO": (jumbo_parse, "JUMBO"),
-        "LIDL": (lidl_parse, "LIDL"),
-        "PLUS": (plus_parse, "PLUS")
-    }
-
-    # Retry pages
-    input_folder = "C:/Data/Supermarket_Flyers/Week_26"
-    for pdf_name, pages in failed_pages.items():
-        filepath = f"{input_folder}/{pdf_name}"
-        supermarket = next((key for key in parser_map if key in pdf_name.upper()), None)
-
-        if supermarket:
-            parse_func, supermarket_name = parser_map[supermarket]
-            write_log(f"\n--- RETRY: {filepath} --- Pages: {pages}")
-            offers = parse_func(filepath, args.week, pages_to_parse=pages)
-
-            total_inserted = 0
-            total_skipped = 0  # ✅ new counter
-
-            for offer in offers:
-                # ✅ Fix SourcePDF: keep only filename (without full path)
-                offer_sourcepdf = os.path.basename(offer["SourcePDF"])
-
-                try:
-                    cursor.execute("""
-                        INSERT INTO dbo.Supermarket_Offers
-                        (SupermarketName, WeekNumber, ProductName, OfferType, OriginalPrice, OfferPrice, SourcePDF, InsertedAt, PageNumber)
-                        SELECT ?, ?, ?, ?, ?, ?, ?, ?, ?
-                        WHERE NOT EXISTS (
-                            SELECT 1 FROM dbo.Supermarket_Offers
-                            WHERE WeekNumber = ?
-                            AND ProductName = ?
-                            AND OfferType = ?
-                            AND OriginalPrice = ?
-                            AND OfferPrice = ?
-                            AND SourcePDF = ?
-                            AND PageNumber = ?
-                        )
-                    """, (
-                        supermarket_name,
-                        args.week,
-                        offer["ProductName"],
-                        offer["OfferType"],
-                        offer["OriginalPrice"],
-                        offer["OfferPrice"],
-                        offer_sourcepdf,
-                        offer["InsertedAt"],
-                        offer["PageNumber"],
-                        # params for WHERE NOT EXISTS
-                        args.week,
-                        offer["ProductName"],
-                        offer["OfferType"],
-                        offer["OriginalPrice"],
-                        offer["OfferPrice"],
-                        offer_sourcepdf,
-                        offer["PageNumber"]
-                    ))
-
-                    if cursor.rowcount > 0:
-                        total_inserted += 1
-                    else:
-                        total_skipped += 1  # duplicate
-
-                except Exception as e:
-                    write_log(f"[ERROR] Failed to insert offer: {offer} — {e}")
-
-            conn.commit()
-            write_log(f"[RESULT] Inserted {total_inserted} offers, Skipped {total_skipped} duplicates for: {supermarket_name}")
+    for filepath, supermarket, pages in failed_pages:
+        write_log(f"→ {filepath}: pages {pages}")
+
+    # Retry pages — same pipeline as main.py, offers are written as they stream in and
+    # duplicates are dropped by the DedupHash anti-join
+    for filepath, supermarket, pages in failed_pages:
+        try:
+            process_flyer(filepath, supermarket, args.week, pages_to_parse=pages, label=f"RETRY (pages {pages})")
+        except Exception as e:
+            write_log(f"[ERROR] Failed to retry flyer: {filepath} — {e}")
+
+    image_profiles.log_stats()
+    log_cache_stats()
+    render_cache.log_stats()
+    write_log(f"[JOURNAL] Week {args.week} pages: {run_journal.get_stats(args.week)}")
 
 else:
     write_log("\n✅ No failed pages found — nothing to retry.")
 
-conn.close()
+run_journal.close_journal()
+close_log()
@@ -0,0 +1,132 @@
+# run_journal.py
+
+import os
+import time
+import sqlite3
+import threading
+
+# Durable per-page journal of a run: state, timings and attempts of every page, written by the
+# parse engine as it goes. main.py --resume and retry_failed_pages.py read it to find the pages
+# that still need work (and the PDF they came from) — no log scraping.
+#   pending   — selected for parsing, not started yet
+#   in_flight — request sent
+#   done      — offers parsed and committed to the DB
+#   failed    — gave up after all retries ([SKIP_PAGE]), or the DB write failed
+JOURNAL_PATH = "run_journal.sqlite"
+
+_conn = None
+_lock = threading.Lock()
+
+
+def open_journal(path=None):
+    global _conn
+    with _lock:
+        if _conn is not None:
+            return
+        _conn = sqlite3.connect(path or JOURNAL_PATH, check_same_thread=False, timeout=30)
+        _conn.execute("PRAGMA journal_mode=WAL")
+        _conn.execute("""
+            CREATE TABLE IF NOT EXISTS pages (
+                week INTEGER NOT NULL,
+                pdf_name TEXT NOT NULL,
+                page INTEGER NOT NULL,
+                filepath TEXT NOT NULL,
+                chain TEXT NOT NULL,
+                state TEXT NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                offers INTEGER,
+                started_at REAL,
+                finished_at REAL,
+                duration REAL,
+                updated_at REAL NOT NULL,
+                PRIMARY KEY (week, pdf_name, page)
+            )
+        """)
+        _conn.commit()
+
+
+def close_journal():
+    global _conn
+    with _lock:
+        if _conn is not None:
+            _conn.close()
+            _conn = None
+
+
+# Helper — one write + commit; a no-op when no journal is open (e.g. compare_profiles.py)
+def _execute(sql, params):
+    with _lock:
+        if _conn is None:
+            return
+        _conn.execute(sql, params)
+        _conn.commit()
+
+
+# A flyer's selected pages are about to be parsed — they start (again) as pending
+def add_pages(week_number, filepath, chain, page_numbers):
+    now = time.time()
+    with _lock:
+        if _conn is None:
+            return
+        _conn.executemany("""
+            INSERT INTO pages (week, pdf_name, page, filepath, chain, state, updated_at)
+            VALUES (?, ?, ?, ?, ?, 'pending', ?)
+            ON CONFLICT (week, pdf_name, page) DO UPDATE SET
+                filepath = excluded.filepath, chain = excluded.chain, state = 'pending', updated_at = excluded.updated_at
+        """, [(week_number, os.path.basename(filepath), page, os.path.abspath(filepath), chain, now) for page in page_numbers])
+        _conn.commit()
+
+
+def page_started(week_number, filepath, page_number):
+    now = time.time()
+    _execute("""
+        UPDATE pages SET state = 'in_flight', started_at = ?, finished_at = NULL, duration = NULL, updated_at = ?
+        WHERE week = ? AND pdf_name = ? AND page = ?
+    """, (now, now, week_number, os.path.basename(filepath), page_number))
+
+
+def page_finished(week_number, filepath, page_number, ok, offers=0, attempts=0):
+    now = time.time()
+    _execute("""
+        UPDATE pages SET state = ?, offers = ?, attempts = attempts + ?, finished_at = ?,
+               duration = ? - started_at, updated_at = ?
+        WHERE week = ? AND pdf_name = ? AND page = ?
+    """, ("done" if ok else "failed", offers, attempts, now, now, now, week_number, os.path.basename(filepath), page_number))
+
+
+# Pages of the week that are done, per PDF name → {pdf_name: {page, ...}}
+def done_pages(week_number):
+    with _lock:
+        rows = _conn.execute(
+            "SELECT pdf_name, page FROM pages WHERE week = ? AND state = 'done'", (week_number,)
+        ).fetchall()
+    done = {}
+    for pdf_name, page in rows:
+        done.setdefault(pdf_name, set()).add(page)
+    return done
+
+
+# Pages of the week that still need work (failed, or cut short by a crash), with the original
+# file path → [(filepath, chain, [page, ...]), ...]
+def unfinished_pages(week_number):
+    with _lock:
+        rows = _conn.execute("""
+            SELECT filepath, chain, page FROM pages
+            WHERE week = ? AND state <> 'done'
+            ORDER BY filepath, page
+        """, (week_number,)).fetchall()
+    flyers = {}
+    for filepath, chain, page in rows:
+        flyers.setdefault((filepath, chain), []).append(page)
+    return [(filepath, chain, pages) for (filepath, chain), pages in flyers.items()]
+
+
+# Helper — state counts for the log, e.g. {"done": 40, "failed": 2}
+def get_stats(week_number):
+    with _lock:
+        if _conn is None:
+            return {}
+        rows = _conn.execute(
+            "SELECT state, COUNT(*) FROM pages WHERE week = ? GROUP BY state", (week_number,)
+        ).fetchall()
+    return dict(rows)
@@ -0,0 +1,90 @@
+# week_manifest.py
+
+import os
+import json
+import time
+from log_writer import write_log
+
+# Manifest of a week folder: every PDF's size, mtime and SHA-256, and which of its pages are done.
+# main.py checks it before parsing, so a re-run of the same folder only touches what changed:
+#   new       — not in the manifest → all pages
+#   replaced  — same name, other content (SHA-256) → all pages again
+#   unchanged — same content → only the pages that aren't done (none left = flyer skipped)
+# Size + mtime equal to the manifest counts as unchanged without reading the file; otherwise the
+# file is hashed, so a copied / touched but identical flyer is still recognized.
+MANIFEST_NAME = "flyer_manifest.json"
+
+
+class WeekManifest:
+    def __init__(self, folder, week_number):
+        self.path = os.path.join(folder, MANIFEST_NAME)
+        self.week_number = week_number
+        self.files = {}
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            write_log(f"[WARNING] Manifest {self.path} unreadable ({e}) — all flyers count as new")
+            return
+        if data.get("week") != week_number:
+            write_log(f"[MANIFEST] {self.path} is for week {data.get('week')}, not {week_number} — all flyers count as new")
+            return
+        self.files = data.get("files", {})
+
+    # → ("new" / "replaced" / "unchanged", sha256 or None when size + mtime were enough)
+    def check(self, filepath):
+        from parsers.render_cache import pdf_sha256
+
+        entry = self.files.get(os.path.basename(filepath))
+        if entry is None:
+            return "new", None
+        stat = os.stat(filepath)
+        if stat.st_size == entry["size"] and stat.st_mtime_ns == entry["mtime_ns"]:
+            return "unchanged", entry["sha256"]
+        sha256 = pdf_sha256(filepath)
+        return ("unchanged" if sha256 == entry["sha256"] else "replaced"), sha256
+
+    # Pages still to parse for this flyer → (status, [page, ...])
+    def pages_left(self, filepath, pages_to_parse):
+        status, _ = self.check(filepath)
+        if status != "unchanged":
+            return status, list(pages_to_parse)
+        done = set(self.files[os.path.basename(filepath)]["done_pages"])
+        return status, [page for page in pages_to_parse if page not in done]
+
+    # Record a flyer's outcome after it was parsed — done_pages from the run journal. Pages done
+    # in an earlier run of the same file stay done.
+    def record(self, filepath, chain, pages_to_parse, done_pages):
+        from parsers.render_cache import pdf_sha256
+
+        name = os.path.basename(filepath)
+        stat = os.stat(filepath)
+        sha256 = pdf_sha256(filepath)
+        previous = self.files.get(name)
+        done = set(done_pages) & set(pages_to_parse)
+        if previous is not None and previous["sha256"] == sha256:
+            done |= set(previous["done_pages"])
+        failed = sorted(set(pages_to_parse) - done)
+        self.files[name] = {
+            "size": stat.st_size,
+            "mtime_ns": stat.st_mtime_ns,
+            "sha256": sha256,
+            "chain": chain,
+            "done_pages": sorted(done),
+            "failed_pages": failed,
+            "status": "partial" if failed else "done",
+            "processed_at": time.strftime("%Y-%m-%d %H:%M:%S"),
+        }
+
+    # Written after every flyer (temp file + rename), so a crash loses at most the flyer in progress
+    def save(self):
+        temp_path = f"{self.path}.{os.getpid()}.tmp"
+        try:
+            with open(temp_path, "w", encoding="utf-8") as f:
+                json.dump({"week": self.week_number, "files": self.files}, f, indent=2, ensure_ascii=False)
+                f.write("\n")
+            os.replace(temp_path, self.path)
+        except OSError as e:
+            write_log(f"[WARNING] Manifest {self.path} not saved: {e} — the next run parses these flyers again")
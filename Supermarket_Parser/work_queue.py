@@ -0,0 +1,261 @@
+# work_queue.py
+
+import os
+import time
+import socket
+import sqlite3
+import threading
+from log_writer import write_log
+
+# Shared work queue for spreading a week over several machines. A coordinator (main.py --enqueue)
+# puts one task per (PDF, page) into a SQLite file on a shared path; any number of workers
+# (main.py --worker) lease a few pages of one PDF at a time, parse them and write the offers to
+# the DB themselves. A lease runs out after LEASE_SECONDS unless the worker renews it (a
+# heartbeat thread does, every LEASE_SECONDS / 3) — the pages of a worker that died go back to
+# the queue, up to MAX_TASK_ATTEMPTS leases per page.
+#   queued — waiting for a worker
+#   leased — a worker has it until lease_until
+#   done   — offers parsed and committed to the DB
+#   failed — still not done after MAX_TASK_ATTEMPTS leases
+# Every lease / renew / finish is one short BEGIN IMMEDIATE transaction, so the workers take
+# turns on the file lock. Rollback journal, not WAL: WAL needs shared memory, which doesn't work
+# for a file on a network share.
+QUEUE_PATH = "work_queue.sqlite"   # Adjust as needed — a path every worker machine can reach
+LEASE_SECONDS = 180                # Adjust as needed — longer than a page takes with retries
+LEASE_PAGES = 2                    # pages of one PDF per lease — they share one render / writer
+MAX_TASK_ATTEMPTS = 3              # leases per page before it counts as failed
+WORKER_LEASES = 4                  # leases a worker parses at the same time (--parallel_flyers)
+POLL_SECONDS = 5                   # wait between looks at the queue when other workers hold the rest
+
+_conn = None
+_lock = threading.Lock()
+
+
+def open_queue(path=None):
+    global _conn
+    with _lock:
+        if _conn is not None:
+            return
+        _conn = sqlite3.connect(path or QUEUE_PATH, check_same_thread=False, timeout=60, isolation_level=None)
+        _conn.execute("PRAGMA journal_mode=DELETE")
+        _conn.execute("""
+            CREATE TABLE IF NOT EXISTS tasks (
+                week INTEGER NOT NULL,
+                pdf_name TEXT NOT NULL,
+                page INTEGER NOT NULL,
+                filepath TEXT NOT NULL,
+                pdf_sha256 TEXT,
+                chain TEXT NOT NULL,
+                state TEXT NOT NULL,
+                worker TEXT,
+                lease_until REAL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                updated_at REAL NOT NULL,
+                PRIMARY KEY (week, pdf_name, page)
+            )
+        """)
+        # Queue files from before pdf_sha256 — their done pages count as changed once (no hash to compare)
+        if "pdf_sha256" not in {row[1] for row in _conn.execute("PRAGMA table_info(tasks)")}:
+            _conn.execute("ALTER TABLE tasks ADD COLUMN pdf_sha256 TEXT")
+        _conn.execute("CREATE INDEX IF NOT EXISTS ix_tasks_state ON tasks (week, state, pdf_name, page)")
+
+
+def close_queue():
+    global _conn
+    with _lock:
+        if _conn is not None:
+            _conn.close()
+            _conn = None
+
+
+# Helper — host + process id, so a worker's leases can be told apart in the queue
+def default_worker_id():
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+
+# Helper — run fn(conn) in one BEGIN IMMEDIATE transaction (takes the write lock up front, so two
+# workers can't lease the same page)
+def _transaction(fn):
+    with _lock:
+        _conn.execute("BEGIN IMMEDIATE")
+        try:
+            result = fn(_conn)
+        except BaseException:
+            _conn.execute("ROLLBACK")
+            raise
+        _conn.execute("COMMIT")
+        return result
+
+
+# Coordinator: the week's selected pages → queued. Pages a worker holds right now keep their lease,
+# and done pages stay done unless the PDF changed since (its SHA-256) or requeue_done is set
+# (--full) — the coordinator's manifest and journal don't know what other machines finished.
+# Failed pages are queued again.
+# flyers = [(filepath, chain, [page, ...]), ...] → number of pages queued
+def enqueue(week_number, flyers, requeue_done=False):
+    from parsers.render_cache import pdf_sha256
+
+    now = time.time()
+    rows = []
+    for filepath, chain, pages in flyers:
+        sha256 = pdf_sha256(filepath)
+        rows.extend((week_number, os.path.basename(filepath), page, os.path.abspath(filepath), sha256, chain, now, requeue_done)
+                    for page in pages)
+
+    def run(conn):
+        return conn.executemany("""
+            INSERT INTO tasks (week, pdf_name, page, filepath, pdf_sha256, chain, state, updated_at)
+            VALUES (?1, ?2, ?3, ?4, ?5, ?6, 'queued', ?7)
+            ON CONFLICT (week, pdf_name, page) DO UPDATE SET
+                filepath = excluded.filepath, pdf_sha256 = excluded.pdf_sha256, chain = excluded.chain,
+                state = 'queued', worker = NULL, lease_until = NULL, attempts = 0, updated_at = excluded.updated_at
+            WHERE CASE tasks.state
+                WHEN 'leased' THEN tasks.lease_until < excluded.updated_at
+                WHEN 'done' THEN ?8 OR tasks.pdf_sha256 IS NOT excluded.pdf_sha256
+                ELSE 1
+            END
+        """, rows).rowcount
+    return _transaction(run)
+
+
+# Helper — leases that ran out go back to the queue (or fail after MAX_TASK_ATTEMPTS) → count
+def _expire_leases(conn, week_number, now):
+    cursor = conn.execute("""
+        UPDATE tasks SET state = CASE WHEN attempts >= ? THEN 'failed' ELSE 'queued' END,
+               worker = NULL, lease_until = NULL, updated_at = ?
+        WHERE week = ? AND state = 'leased' AND lease_until < ?
+    """, (MAX_TASK_ATTEMPTS, now, week_number, now))
+    return cursor.rowcount
+
+
+# Worker: lease up to max_pages queued pages of one PDF → (pdf_name, filepath, chain, [page, ...]),
+# or None when nothing is queued right now (other workers may still hold leases, see pending()).
+# pdf_name is the coordinator's file name — use it for the queue and the journal, not a basename
+# of filepath (the coordinator's path may be from another OS).
+def lease(week_number, worker_id, max_pages=None, lease_seconds=None):
+    max_pages = max_pages or LEASE_PAGES
+    lease_seconds = lease_seconds or LEASE_SECONDS
+
+    def run(conn):
+        now = time.time()
+        requeued = _expire_leases(conn, week_number, now)
+        first = conn.execute("""
+            SELECT pdf_name, filepath, chain FROM tasks
+            WHERE week = ? AND state = 'queued'
+            ORDER BY pdf_name, page LIMIT 1
+        """, (week_number,)).fetchone()
+        if first is None:
+            return None, requeued
+        pdf_name, filepath, chain = first
+        pages = [page for (page,) in conn.execute("""
+            SELECT page FROM tasks
+            WHERE week = ? AND pdf_name = ? AND state = 'queued'
+            ORDER BY page LIMIT ?
+        """, (week_number, pdf_name, max_pages))]
+        conn.executemany("""
+            UPDATE tasks SET state = 'leased', worker = ?, lease_until = ?, attempts = attempts + 1, updated_at = ?
+            WHERE week = ? AND pdf_name = ? AND page = ?
+        """, [(worker_id, now + lease_seconds, now, week_number, pdf_name, page) for page in pages])
+        return (pdf_name, filepath, chain, pages), requeued
+
+    task, requeued = _transaction(run)
+    if requeued:
+        write_log(f"[QUEUE] {requeued} pages whose lease ran out went back to the queue")
+    return task
+
+
+# Worker heartbeat: push out the lease of every page this worker holds → pages renewed
+def renew(week_number, worker_id, lease_seconds=None):
+    now = time.time()
+    return _transaction(lambda conn: conn.execute("""
+        UPDATE tasks SET lease_until = ?, updated_at = ?
+        WHERE week = ? AND worker = ? AND state = 'leased'
+    """, (now + (lease_seconds or LEASE_SECONDS), now, week_number, worker_id)).rowcount)
+
+
+# Worker: a lease is over — done_pages are committed to the DB, the lease's other pages go back to
+# the queue for another worker (or fail after MAX_TASK_ATTEMPTS). Only pages this worker still
+# holds count: a page whose lease ran out and that another worker leased meanwhile is theirs now
+# (the DB's dedup index drops the offers both of them wrote). → (done, not done) page counts
+def finish(week_number, worker_id, pdf_name, pages, done_pages):
+    now = time.time()
+    done_pages = set(done_pages)
+
+    def run(conn):
+        done = not_done = 0
+        for page in pages:
+            cursor = conn.execute("""
+                UPDATE tasks SET state = CASE WHEN ? THEN 'done' WHEN attempts >= ? THEN 'failed' ELSE 'queued' END,
+                       worker = NULL, lease_until = NULL, updated_at = ?
+                WHERE week = ? AND pdf_name = ? AND page = ? AND worker = ? AND state = 'leased'
+            """, (page in done_pages, MAX_TASK_ATTEMPTS, now, week_number, pdf_name, page, worker_id))
+            if cursor.rowcount and page in done_pages:
+                done += 1
+            elif cursor.rowcount:
+                not_done += 1
+        return done, not_done
+    return _transaction(run)
+
+
+# Worker shutting down: its leased pages go back to the queue right away instead of waiting for
+# the lease to run out
+def release(week_number, worker_id):
+    now = time.time()
+    return _transaction(lambda conn: conn.execute("""
+        UPDATE tasks SET state = CASE WHEN attempts >= ? THEN 'failed' ELSE 'queued' END,
+               worker = NULL, lease_until = NULL, updated_at = ?
+        WHERE week = ? AND worker = ? AND state = 'leased'
+    """, (MAX_TASK_ATTEMPTS, now, week_number, worker_id)).rowcount)
+
+
+# Pages of the week that aren't finished yet (queued or leased)
+def pending(week_number):
+    with _lock:
+        return _conn.execute(
+            "SELECT COUNT(*) FROM tasks WHERE week = ? AND state IN ('queued', 'leased')", (week_number,)
+        ).fetchone()[0]
+
+
+# Pages of the week that are done, per PDF name → {pdf_name: {page, ...}} (for the week manifest)
+def done_pages(week_number):
+    with _lock:
+        rows = _conn.execute(
+            "SELECT pdf_name, page FROM tasks WHERE week = ? AND state = 'done'", (week_number,)
+        ).fetchall()
+    done = {}
+    for pdf_name, page in rows:
+        done.setdefault(pdf_name, set()).add(page)
+    return done
+
+
+# Helper — state counts for the log, e.g. {"done": 40, "leased": 4, "queued": 12}
+def get_stats(week_number):
+    with _lock:
+        if _conn is None:
+            return {}
+        rows = _conn.execute(
+            "SELECT state, COUNT(*) FROM tasks WHERE week = ? GROUP BY state", (week_number,)
+        ).fetchall()
+    return dict(rows)
+
+
+# Keeps a worker's leases alive while it parses — renew() every LEASE_SECONDS / 3 until stopped
+class LeaseHeartbeat:
+    def __init__(self, week_number, worker_id, lease_seconds=None):
+        self.week_number = week_number
+        self.worker_id = worker_id
+        self.lease_seconds = lease_seconds or LEASE_SECONDS
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="lease-heartbeat", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while not self._stop.wait(self.lease_seconds / 3):
+            try:
+                renew(self.week_number, self.worker_id, self.lease_seconds)
+            except sqlite3.Error as e:
+                write_log(f"[WARNING] Lease renewal failed: {e} — retrying in {self.lease_seconds / 3:.0f}s")
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()